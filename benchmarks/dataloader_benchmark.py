@@ -0,0 +1,180 @@
+"""Benchmark of the input pipeline on synthetic datasets
+
+Measures images/sec, first batch latency and the CPU usage of every worker for each
+dataset type, augmentation profile, worker count and batch size and writes the results as JSON:
+
+    python -m benchmarks.dataloader_benchmark --workers 0 4 8 --batch-sizes 32 64
+"""
+import argparse
+import json
+import os
+import platform
+import tempfile
+import time
+
+import torch
+from torch.utils.data import get_worker_info
+
+from benchmarks import synthetic
+from lib.data.collate import DetectionBatch
+from lib.data.data_loader import DataLoader
+
+METHODS = {"imagefolder": "classification", "voc": "detection", "coco": "detection"}
+
+# DataConfig values overwritten by every profile, the default profile uses DATA.ini as is
+AUGMENTATION_PROFILES = {
+    "default": {},
+    "minimal": {"auto_augment": False, "hor_flipping": False, "random_erase_prob": 0.0},
+    "imagenet": {"auto_augment": True, "auto_augment_policy": "imagenet"},
+    "randomaugment": {"auto_augment": True, "auto_augment_policy": "randomaugment"},
+    "trivialaugmentwide": {"auto_augment": True, "auto_augment_policy": "trivialaugmentwide"},
+    "augmix": {"auto_augment": True, "auto_augment_policy": "augmix"},
+    "batch_augment": {"batch_augment": True}
+}
+
+# Profiles that only change classification transforms
+CLASSIFICATION_PROFILES = ("imagenet", "randomaugment", "trivialaugmentwide", "augmix",
+                           "batch_augment")
+
+
+class _CpuTimedDataset:
+    """Dataset wrapper storing the CPU time of every worker process in a shared tensor"""
+
+    def __init__(self, dataset, cpu_times: torch.Tensor):
+        self.dataset = dataset
+        self.cpu_times: torch.Tensor = cpu_times
+
+    def __getattr__(self, name):
+        # Guard against recursion while unpickling in spawned workers
+        if name == "dataset":
+            raise AttributeError(name)
+        return getattr(self.dataset, name)
+
+    def __len__(self):
+        return len(self.dataset)
+
+    def __getitem__(self, index):
+        item = self.dataset[index]
+        worker_info = get_worker_info()
+        if worker_info is not None:
+            # CPU times of a forked worker start at zero
+            self.cpu_times[worker_info.id] = time.process_time()
+        return item
+
+
+def _get_batch_images(batch) -> tuple:
+    """Images and number of images of a batch"""
+    if isinstance(batch, DetectionBatch):
+        return batch.images, len(batch)
+    return batch[0], batch[0].shape[0]
+
+
+def run_case(data_loader: DataLoader, split_path: str, dataset_type: str, workers: int,
+             batch_size: int, num_batches: int) -> dict:
+    """Iterate `num_batches` batches and measure the throughput after the first batch"""
+    data_loader.load_dataset(split_path=split_path, dataset_type=dataset_type, is_train=True,
+                             method=data_loader.method)
+    cpu_times = torch.zeros(max(workers, 1), dtype=torch.float64).share_memory_()
+    data_loader.train_dataset = _CpuTimedDataset(data_loader.train_dataset, cpu_times)
+    loader = data_loader.get_data_loader(is_train=True, batch_size=batch_size, workers=workers)
+    batch_transforms = data_loader.batch_transforms_train
+
+    main_cpu_start = time.process_time()
+    start = time.perf_counter()
+    iterator = iter(loader)
+    first_batch_latency = None
+    steady_start = start
+    num_images = 0
+    num_measured = 0
+    for batch_index in range(num_batches):
+        batch = next(iterator, None)
+        if batch is None:
+            break
+        images, batch_images = _get_batch_images(batch)
+        if batch_transforms is not None:
+            batch_transforms(images)
+        if batch_index == 0:
+            steady_start = time.perf_counter()
+            first_batch_latency = steady_start - start
+        else:
+            num_images += batch_images
+            num_measured += 1
+    steady_duration = time.perf_counter() - steady_start
+    main_cpu = time.process_time() - main_cpu_start
+    wall = time.perf_counter() - start
+    del iterator
+
+    worker_cpu = [main_cpu] if workers == 0 else cpu_times.tolist()
+    return {
+        "images_per_sec": num_images / steady_duration if num_measured else 0.,
+        "first_batch_latency_s": first_batch_latency,
+        "measured_batches": num_measured,
+        "main_cpu_s": main_cpu,
+        "worker_cpu_s": worker_cpu,
+        "worker_utilization": [cpu / wall for cpu in worker_cpu]
+    }
+
+
+def get_args_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Input pipeline benchmark on synthetic data")
+    parser.add_argument("--data-dir", type=str,
+                        default=os.path.join(tempfile.gettempdir(), "simple-torch-training-bench"),
+                        help="Directory for the synthetic datasets - default: %(default)s")
+    parser.add_argument("--dataset-types", nargs="+", default=list(synthetic.DATASET_TYPES),
+                        choices=synthetic.DATASET_TYPES)
+    parser.add_argument("--profiles", nargs="+", default=list(AUGMENTATION_PROFILES),
+                        choices=list(AUGMENTATION_PROFILES))
+    parser.add_argument("--num-images", type=int, default=512)
+    parser.add_argument("--image-size", type=int, nargs=2, default=[375, 500],
+                        metavar=("HEIGHT", "WIDTH"))
+    parser.add_argument("--num-classes", type=int, default=10)
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, 2, 4, 8])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[32, 64])
+    parser.add_argument("--batches", type=int, default=20,
+                        help="Batches per case including the first one - default: %(default)s")
+    parser.add_argument("--output", type=str, default="dataloader_benchmark.json")
+    return parser
+
+
+def main(args):
+    results = []
+    for dataset_type in args.dataset_types:
+        method = METHODS[dataset_type]
+        split_path = synthetic.generate_dataset(os.path.join(args.data_dir, dataset_type),
+                                                dataset_type=dataset_type,
+                                                num_images=args.num_images,
+                                                image_size=tuple(args.image_size),
+                                                num_classes=args.num_classes)
+        for profile in args.profiles:
+            if method != "classification" and profile in CLASSIFICATION_PROFILES:
+                continue
+            for workers in args.workers:
+                for batch_size in args.batch_sizes:
+                    data_loader = DataLoader(custom=False, device=torch.device("cpu"),
+                                             method=method)
+                    for key, value in AUGMENTATION_PROFILES[profile].items():
+                        setattr(data_loader.config, key, value)
+                    data_loader.refresh_transforms()
+
+                    result = run_case(data_loader, split_path, dataset_type, workers,
+                                      batch_size, args.batches)
+                    result.update({"dataset_type": dataset_type, "profile": profile,
+                                   "workers": workers, "batch_size": batch_size})
+                    results.append(result)
+                    print(f"{dataset_type:<12}{profile:<20}workers {workers:<4}"
+                          f"batch {batch_size:<5}{result['images_per_sec']:>9.1f} img/s    "
+                          f"first batch {result['first_batch_latency_s']:.2f}s")
+
+    report = {
+        "environment": {"python": platform.python_version(), "torch": torch.__version__,
+                        "platform": platform.platform(), "cpu_count": os.cpu_count()},
+        "settings": vars(args),
+        "results": results
+    }
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+    print(f"Saved results to {args.output}")
+
+
+if __name__ == '__main__':
+    main(get_args_parser().parse_args())
@@ -0,0 +1,113 @@
+"""Benchmark of reduced-resolution JPEG decoding against full decoding
+
+Decodes large synthetic JPEGs fully and with DCT-domain scaling, resizes and center crops both
+to the target size like the eval transforms and compares decode time and the PSNR between
+the two results:
+
+    python -m benchmarks.decode_benchmark --image-size 3000 4000 --target-sizes 224 256
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+from torchvision import transforms
+
+from benchmarks import synthetic
+from lib.data.decoding import draft_decode
+
+
+def _psnr(reference: np.ndarray, image: np.ndarray) -> float:
+    mse = np.mean((reference.astype(np.float64) - image.astype(np.float64)) ** 2)
+    if mse == 0:
+        return float("inf")
+    return float(10 * np.log10(255 ** 2 / mse))
+
+
+def run_case(image_paths: list, target_size: int) -> dict:
+    """Decode every image fully and drafted and resize both to the target size"""
+    resize = transforms.Compose([transforms.Resize(target_size),
+                                 transforms.CenterCrop(target_size)])
+    full_times, draft_times, decoded_sizes, psnrs = [], [], [], []
+    for image_path in image_paths:
+        start = time.perf_counter()
+        with open(image_path, "rb") as image_file:
+            reference = resize(Image.open(image_file).convert("RGB"))
+        full_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        with open(image_path, "rb") as image_file:
+            decoded = draft_decode(image_file, (target_size, target_size))
+            image = resize(decoded)
+        draft_times.append(time.perf_counter() - start)
+
+        decoded_sizes.append(min(decoded.size))
+        psnrs.append(_psnr(np.asarray(reference), np.asarray(image)))
+
+    return {
+        "target_size": target_size,
+        "full_ms": 1000 * float(np.mean(full_times)),
+        "draft_ms": 1000 * float(np.mean(draft_times)),
+        "speedup": float(np.mean(full_times) / np.mean(draft_times)),
+        "min_decoded_size": min(decoded_sizes),
+        "min_psnr_db": float(np.min(psnrs)),
+        "mean_psnr_db": float(np.mean(psnrs))
+    }
+
+
+def get_args_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Reduced-resolution JPEG decoding benchmark")
+    parser.add_argument("--data-dir", type=str,
+                        default=os.path.join(tempfile.gettempdir(), "simple-torch-training-bench"),
+                        help="Directory for the synthetic images - default: %(default)s")
+    parser.add_argument("--num-images", type=int, default=32)
+    parser.add_argument("--image-size", type=int, nargs=2, default=[3000, 4000],
+                        metavar=("HEIGHT", "WIDTH"))
+    parser.add_argument("--target-sizes", type=int, nargs="+", default=[224, 256])
+    parser.add_argument("--min-psnr", type=float, default=30.,
+                        help="Fail if a drafted image is below this PSNR - default: %(default)s")
+    parser.add_argument("--output", type=str, default="decode_benchmark.json")
+    return parser
+
+
+def main(args):
+    root = synthetic.generate_dataset(os.path.join(args.data_dir, "large_jpegs"),
+                                      dataset_type="imagefolder", num_images=args.num_images,
+                                      image_size=tuple(args.image_size), num_classes=1)
+    image_paths = sorted(os.path.join(directory, file_name)
+                         for directory, _, file_names in os.walk(root)
+                         for file_name in file_names if file_name.endswith(".jpg"))
+
+    results = []
+    for target_size in args.target_sizes:
+        result = run_case(image_paths, target_size)
+        results.append(result)
+        print(f"target {target_size:<6}full {result['full_ms']:>8.1f} ms    "
+              f"draft {result['draft_ms']:>7.1f} ms    speedup {result['speedup']:>5.1f}x    "
+              f"min PSNR {result['min_psnr_db']:.1f} dB")
+
+    report = {
+        "environment": {"python": platform.python_version(), "platform": platform.platform(),
+                        "pillow": Image.__version__},
+        "settings": vars(args),
+        "results": results
+    }
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+    print(f"Saved results to {args.output}")
+
+    for result in results:
+        if result["min_decoded_size"] < result["target_size"]:
+            sys.exit(f"Drafted images were decoded below the target size {result['target_size']}")
+        if result["min_psnr_db"] < args.min_psnr:
+            sys.exit(f"Drafted images at target size {result['target_size']} have a PSNR of "
+                     f"{result['min_psnr_db']:.1f} dB, less than {args.min_psnr} dB")
+
+
+if __name__ == '__main__':
+    main(get_args_parser().parse_args())
@@ -0,0 +1,96 @@
+"""Allocation check of the detection sample pipeline
+
+Runs synthetic VOC and COCO samples through the detection datasets in the main process and
+reads DetectionPipeline.last_allocations, the number of full image allocations of a sample
+counted per transform, including the decode. Fails if a sample needs more allocations than the
+decode plus one per transform, or than --max-allocations if given:
+
+    python -m benchmarks.detection_pipeline_benchmark --max-allocations 3
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+import torch
+
+from benchmarks import synthetic
+from lib.data.data_loader import DataLoader
+
+
+def run_case(data_loader: DataLoader, split_path: str, dataset_type: str,
+             num_samples: int) -> dict:
+    """Load `num_samples` samples and collect their allocations and latency"""
+    data_loader.load_dataset(split_path=split_path, dataset_type=dataset_type, is_train=True,
+                             method="detection")
+    dataset = data_loader.train_dataset
+    allocations, durations = [], []
+    for index in range(min(num_samples, len(dataset))):
+        start = time.perf_counter()
+        _ = dataset[index]
+        durations.append(time.perf_counter() - start)
+        allocations.append(dataset.pipeline.last_allocations)
+    return {
+        "samples": len(allocations),
+        "allocation_budget": dataset.pipeline.allocation_budget,
+        "max_allocations": int(np.max(allocations)),
+        "mean_allocations": float(np.mean(allocations)),
+        "ms_per_sample": 1000 * float(np.mean(durations))
+    }
+
+
+def get_args_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Detection pipeline allocation check")
+    parser.add_argument("--data-dir", type=str,
+                        default=os.path.join(tempfile.gettempdir(), "simple-torch-training-bench"),
+                        help="Directory for the synthetic datasets - default: %(default)s")
+    parser.add_argument("--dataset-types", nargs="+", default=["voc", "coco"],
+                        choices=["voc", "coco"])
+    parser.add_argument("--num-images", type=int, default=64)
+    parser.add_argument("--image-size", type=int, nargs=2, default=[375, 500],
+                        metavar=("HEIGHT", "WIDTH"))
+    parser.add_argument("--max-allocations", type=int, default=None,
+                        help="Allowed full image allocations per sample - default: the decode "
+                             "plus one per transform")
+    parser.add_argument("--output", type=str, default="detection_pipeline_benchmark.json")
+    return parser
+
+
+def main(args):
+    results = []
+    for dataset_type in args.dataset_types:
+        split_path = synthetic.generate_dataset(os.path.join(args.data_dir, dataset_type),
+                                                dataset_type=dataset_type,
+                                                num_images=args.num_images,
+                                                image_size=tuple(args.image_size))
+        data_loader = DataLoader(custom=False, device=torch.device("cpu"), method="detection")
+        result = run_case(data_loader, split_path, dataset_type, args.num_images)
+        result["dataset_type"] = dataset_type
+        results.append(result)
+        print(f"{dataset_type:<8}{result['ms_per_sample']:>7.2f} ms/sample    allocations "
+              f"max {result['max_allocations']}, mean {result['mean_allocations']:.2f}, "
+              f"budget {result['allocation_budget']}")
+
+    report = {
+        "environment": {"python": platform.python_version(), "torch": torch.__version__,
+                        "platform": platform.platform()},
+        "settings": vars(args),
+        "results": results
+    }
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+    print(f"Saved results to {args.output}")
+
+    for result in results:
+        max_allocations = args.max_allocations or result["allocation_budget"]
+        if result["max_allocations"] > max_allocations:
+            sys.exit(f"{result['dataset_type']} samples needed {result['max_allocations']} full "
+                     f"image allocations, more than {max_allocations}")
+
+
+if __name__ == '__main__':
+    main(get_args_parser().parse_args())
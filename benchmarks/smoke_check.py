@@ -0,0 +1,94 @@
+"""Smoke check of the input pipeline on small synthetic datasets
+
+Loads one train and one val batch of every dataset type, read from the dataset directory and
+from a packed shard, and fails unless every batch holds image tensors:
+
+    python -m benchmarks.smoke_check --dataset-types imagefolder voc coco
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+import torch
+
+from benchmarks import synthetic
+from lib.data.collate import DetectionBatch
+from lib.data.data_loader import DataLoader
+
+METHODS = {"imagefolder": "classification", "voc": "detection", "coco": "detection"}
+
+
+def _check_batch(batch) -> str:
+    """Error message for a batch that is not a collated tensor batch, None if it is"""
+    images = batch.images if isinstance(batch, DetectionBatch) else batch[0]
+    if not isinstance(images, torch.Tensor):
+        return f"images were collated as {type(images).__name__}, not as a tensor"
+    if images.ndim != 4 or images.shape[0] == 0:
+        return f"images have the shape {tuple(images.shape)}, not (N, C, H, W)"
+    return None
+
+
+def run_case(data_loader: DataLoader, split_path: str, dataset_type: str, cached: bool,
+             workers: int, batch_size: int) -> list:
+    """Load the first train and val batch and return the errors"""
+    errors = []
+    for is_train in (True, False):
+        data_loader.load_dataset(split_path=split_path, dataset_type=dataset_type,
+                                 is_train=is_train, method=data_loader.method)
+        if cached:
+            data_loader.cache_dataset(cache_path=os.path.join(split_path + "_shard",
+                                                              "train" if is_train else "val"),
+                                      dataset_type=dataset_type, is_train=is_train)
+        loader = data_loader.get_data_loader(is_train=is_train, batch_size=batch_size,
+                                             workers=workers)
+        batch = next(iter(loader))
+        error = _check_batch(batch)
+        if error is not None:
+            errors.append(f"{'train' if is_train else 'val'}: {error}")
+            continue
+        batch_transforms = data_loader.batch_transforms_train if is_train \
+            else data_loader.batch_transforms_eval
+        if batch_transforms is not None:
+            batch_transforms(batch.images if isinstance(batch, DetectionBatch) else batch[0])
+    return errors
+
+
+def get_args_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Input pipeline smoke check")
+    parser.add_argument("--data-dir", type=str,
+                        default=os.path.join(tempfile.gettempdir(), "simple-torch-training-smoke"),
+                        help="Directory for the synthetic datasets - default: %(default)s")
+    parser.add_argument("--dataset-types", nargs="+", default=list(synthetic.DATASET_TYPES),
+                        choices=synthetic.DATASET_TYPES)
+    parser.add_argument("--num-images", type=int, default=8)
+    parser.add_argument("--image-size", type=int, nargs=2, default=[96, 128],
+                        metavar=("HEIGHT", "WIDTH"))
+    parser.add_argument("--workers", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=4)
+    return parser
+
+
+def main(args):
+    failures = []
+    for dataset_type in args.dataset_types:
+        method = METHODS[dataset_type]
+        split_path = synthetic.generate_dataset(os.path.join(args.data_dir, dataset_type),
+                                                dataset_type=dataset_type,
+                                                num_images=args.num_images,
+                                                image_size=tuple(args.image_size),
+                                                num_classes=2)
+        for cached in (False, True):
+            data_loader = DataLoader(custom=False, device=torch.device("cpu"), method=method)
+            errors = run_case(data_loader, split_path, dataset_type, cached, args.workers,
+                              args.batch_size)
+            source = "shard" if cached else "files"
+            print(f"{dataset_type:<12}{source:<8}{'failed' if errors else 'ok'}")
+            failures.extend(f"{dataset_type} from {source}, {error}" for error in errors)
+
+    if failures:
+        sys.exit("Smoke check failed:\n" + "\n".join(failures))
+
+
+if __name__ == '__main__':
+    main(get_args_parser().parse_args())
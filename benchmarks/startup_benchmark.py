@@ -0,0 +1,102 @@
+"""Benchmark of the startup time and the import cost of every module
+
+Imports each module in a fresh interpreter with `-X importtime`, times `main.py --help` and
+writes the slowest imports per module as JSON:
+
+    python -m benchmarks.startup_benchmark --modules lib.train.trainer lib.args.args_loader
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MODULES = ("lib.args.args_parser", "lib.args.args_loader", "lib.helpers.constants",
+                   "lib.config_loaders.data_config", "lib.data.data_loader",
+                   "lib.train.trainer")
+
+
+def _parse_importtime(stderr: str) -> list:
+    """Lines of the form `import time: self [us] | cumulative | imported package`"""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        imports.append({"module": fields[2].strip(), "self_us": int(fields[0]),
+                        "cumulative_us": int(fields[1])})
+    return imports
+
+
+def measure_import(module: str, top: int) -> dict:
+    """Import cost of a module in a fresh interpreter"""
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                             cwd=ROOT, capture_output=True, text=True, check=False)
+    wall = time.perf_counter() - start
+    imports = _parse_importtime(process.stderr)
+    total = next((item["cumulative_us"] for item in imports if item["module"] == module), None)
+    return {
+        "module": module,
+        "ok": process.returncode == 0,
+        "wall_s": wall,
+        "cumulative_us": total,
+        "slowest": sorted(imports, key=lambda item: item["self_us"], reverse=True)[:top],
+        "error": process.stderr.strip().splitlines()[-1] if process.returncode else None
+    }
+
+
+def measure_command(command: list, repeats: int) -> dict:
+    """Wall time of a command, best and mean over the repeats"""
+    durations = []
+    returncode = 0
+    for _ in range(repeats):
+        start = time.perf_counter()
+        returncode = subprocess.run(command, cwd=ROOT, capture_output=True,
+                                    check=False).returncode
+        durations.append(time.perf_counter() - start)
+    return {"command": " ".join(command[1:]), "ok": returncode == 0, "best_s": min(durations),
+            "mean_s": sum(durations) / len(durations)}
+
+
+def get_args_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Startup time and import cost benchmark")
+    parser.add_argument("--modules", nargs="+", default=list(DEFAULT_MODULES))
+    parser.add_argument("--top", type=int, default=10,
+                        help="Slowest imports kept per module - default: %(default)s")
+    parser.add_argument("--repeats", type=int, default=5,
+                        help="Runs of main.py --help - default: %(default)s")
+    parser.add_argument("--output", type=str, default="startup_benchmark.json")
+    return parser
+
+
+def main(args):
+    imports = []
+    for module in args.modules:
+        result = measure_import(module, args.top)
+        imports.append(result)
+        total = f"{result['cumulative_us'] / 1000:.1f} ms" if result["ok"] else "failed"
+        print(f"{module:<36}{total:>12}")
+
+    help_result = measure_command([sys.executable, "main.py", "--help"], args.repeats)
+    print(f"{'main.py --help':<36}{help_result['best_s'] * 1000:>9.1f} ms")
+
+    report = {
+        "environment": {"python": platform.python_version(), "platform": platform.platform()},
+        "settings": vars(args),
+        "help": help_result,
+        "imports": imports
+    }
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+    print(f"Saved results to {args.output}")
+
+
+if __name__ == '__main__':
+    main(get_args_parser().parse_args())
@@ -0,0 +1,131 @@
+"""Generators for synthetic datasets in the layouts read by the DataLoader"""
+import json
+import os
+import shutil
+from xml.etree import ElementTree as Et
+
+import numpy as np
+from PIL import Image
+
+DATASET_TYPES = ("imagefolder", "voc", "coco")
+
+_MARKER_FILE = ".synthetic.json"
+
+
+def _random_size(generator: np.random.Generator, image_size: tuple) -> tuple:
+    # Vary the aspect ratio, so aspect ratio grouping has something to group
+    scale = generator.uniform(0.75, 1.25, size=2)
+    return max(int(image_size[0] * scale[0]), 32), max(int(image_size[1] * scale[1]), 32)
+
+
+def _random_image(generator: np.random.Generator, height: int, width: int) -> Image.Image:
+    """Smooth random colours with noise, compresses like a natural photo rather than noise"""
+    low_res = generator.integers(0, 256, size=(max(height // 16, 1), max(width // 16, 1), 3),
+                                 dtype=np.uint8)
+    image = np.asarray(Image.fromarray(low_res).resize((width, height), Image.BILINEAR),
+                       dtype=np.int16)
+    image += generator.integers(-12, 13, size=image.shape, dtype=np.int16)
+    return Image.fromarray(np.clip(image, 0, 255).astype(np.uint8))
+
+
+def _random_boxes(generator: np.random.Generator, height: int, width: int,
+                  max_boxes: int) -> np.ndarray:
+    """Random boxes in pascal voc format (xmin, ymin, xmax, ymax)"""
+    num_boxes = int(generator.integers(1, max_boxes + 1))
+    xs = np.sort(generator.uniform(0, width, size=(num_boxes, 2)), axis=1)
+    ys = np.sort(generator.uniform(0, height, size=(num_boxes, 2)), axis=1)
+    xs[:, 1] = np.maximum(xs[:, 1], np.minimum(xs[:, 0] + 8, width))
+    ys[:, 1] = np.maximum(ys[:, 1], np.minimum(ys[:, 0] + 8, height))
+    return np.round(np.stack([xs[:, 0], ys[:, 0], xs[:, 1], ys[:, 1]], axis=1))
+
+
+def _write_voc_annotation(path: str, file_name: str, height: int, width: int,
+                          boxes: np.ndarray, names: list):
+    annotation = Et.Element("annotation")
+    Et.SubElement(annotation, "filename").text = file_name
+    size = Et.SubElement(annotation, "size")
+    Et.SubElement(size, "width").text = str(width)
+    Et.SubElement(size, "height").text = str(height)
+    Et.SubElement(size, "depth").text = "3"
+    for box, name in zip(boxes, names):
+        obj = Et.SubElement(annotation, "object")
+        Et.SubElement(obj, "name").text = name
+        bndbox = Et.SubElement(obj, "bndbox")
+        for key, value in zip(("xmin", "ymin", "xmax", "ymax"), box):
+            Et.SubElement(bndbox, key).text = str(int(value))
+    Et.ElementTree(annotation).write(path)
+
+
+def generate_imagefolder(root: str, num_images: int, image_size: tuple, num_classes: int,
+                         generator: np.random.Generator):
+    for index in range(num_images):
+        class_dir = os.path.join(root, f"class_{index % num_classes:03d}")
+        os.makedirs(class_dir, exist_ok=True)
+        height, width = _random_size(generator, image_size)
+        _random_image(generator, height, width).save(os.path.join(class_dir, f"{index:06d}.jpg"))
+
+
+def generate_voc(root: str, num_images: int, image_size: tuple, num_classes: int,
+                 generator: np.random.Generator, max_boxes: int = 8):
+    os.makedirs(root, exist_ok=True)
+    for index in range(num_images):
+        height, width = _random_size(generator, image_size)
+        file_name = f"{index:06d}.jpg"
+        _random_image(generator, height, width).save(os.path.join(root, file_name))
+        boxes = _random_boxes(generator, height, width, max_boxes)
+        names = [f"class_{label:03d}" for label in generator.integers(0, num_classes, len(boxes))]
+        _write_voc_annotation(os.path.join(root, f"{index:06d}.xml"), file_name, height, width,
+                              boxes, names)
+
+
+def generate_coco(root: str, num_images: int, image_size: tuple, num_classes: int,
+                  generator: np.random.Generator, max_boxes: int = 8):
+    os.makedirs(root, exist_ok=True)
+    images = []
+    annotations = []
+    for index in range(num_images):
+        height, width = _random_size(generator, image_size)
+        file_name = f"{index:06d}.jpg"
+        _random_image(generator, height, width).save(os.path.join(root, file_name))
+        images.append({"id": index + 1, "file_name": file_name, "height": height, "width": width})
+        for box in _random_boxes(generator, height, width, max_boxes):
+            box_width, box_height = float(box[2] - box[0]), float(box[3] - box[1])
+            annotations.append({"id": len(annotations) + 1,
+                                "image_id": index + 1,
+                                "bbox": [float(box[0]), float(box[1]), box_width, box_height],
+                                "area": box_width * box_height,
+                                "category_id": int(generator.integers(1, num_classes + 1)),
+                                "iscrowd": 0})
+    categories = [{"id": label, "name": f"class_{label:03d}"}
+                  for label in range(1, num_classes + 1)]
+    with open(f"{root}.json", "w", encoding="utf-8") as file:
+        json.dump({"images": images, "annotations": annotations, "categories": categories}, file)
+
+
+def generate_dataset(root: str, dataset_type: str, num_images: int, image_size: tuple,
+                     num_classes: int = 10, seed: int = 0) -> str:
+    """Generate a dataset split at root, an existing split with the same settings is reused"""
+    settings = {"dataset_type": dataset_type, "num_images": num_images,
+                "image_size": list(image_size), "num_classes": num_classes, "seed": seed}
+    marker = os.path.join(root, _MARKER_FILE)
+    if os.path.isfile(marker):
+        with open(marker, encoding="utf-8") as file:
+            if json.load(file) == settings:
+                return root
+        shutil.rmtree(root)
+    elif os.path.isdir(root) and os.listdir(root):
+        raise ValueError(f"{root} is not empty and was not generated by this module!")
+
+    generator = np.random.default_rng(seed)
+    if dataset_type == "imagefolder":
+        generate_imagefolder(root, num_images, image_size, num_classes, generator)
+    elif dataset_type == "voc":
+        generate_voc(root, num_images, image_size, num_classes, generator)
+    elif dataset_type == "coco":
+        generate_coco(root, num_images, image_size, num_classes, generator)
+    else:
+        raise ValueError(f"Dataset type must be one of: {', '.join(DATASET_TYPES)}")
+
+    with open(marker, "w", encoding="utf-8") as file:
+        json.dump(settings, file)
+    return root
@@ -0,0 +1,163 @@
+"""Memory regression check of the sample index in forked dataloader workers
+
+Iterates one epoch over a large synthetic image folder and measures how much private memory
+every worker gains. Sample lists of Python objects are copied into each worker as their
+reference counts change, numpy backed indexes stay shared with the main process:
+
+    python -m benchmarks.worker_memory_benchmark --num-images 200000 --max-growth-mb 16
+
+Requires Linux, the memory of a worker is read from /proc/self/smaps_rollup
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+
+import numpy as np
+import torch
+from torch.utils.data import DataLoader, get_worker_info
+from torchvision import datasets, transforms
+
+from benchmarks import synthetic
+from lib.data.image_folder import FastImageFolder
+
+DATASET_CLASSES = {"fast": FastImageFolder, "torchvision": datasets.ImageFolder}
+
+_SMAPS_FILE = "/proc/self/smaps_rollup"
+
+
+def _get_memory() -> tuple:
+    """Resident and private (unshared) memory of the current process in bytes"""
+    values = {}
+    with open(_SMAPS_FILE, encoding="utf-8") as file:
+        for line in file:
+            fields = line.split()
+            if len(fields) == 3 and fields[2] == "kB":
+                values[fields[0].rstrip(":")] = int(fields[1]) * 1024
+    return values["Rss"], values["Private_Clean"] + values["Private_Dirty"]
+
+
+class _MemoryTrackedDataset:
+    """Dataset wrapper storing the memory of every worker at its first and latest sample"""
+
+    def __init__(self, dataset, memory: torch.Tensor):
+        self.dataset = dataset
+        self.memory: torch.Tensor = memory
+
+    def __len__(self):
+        return len(self.dataset)
+
+    def __getitem__(self, index):
+        item = self.dataset[index]
+        worker_info = get_worker_info()
+        if worker_info is not None:
+            rss, private = _get_memory()
+            if self.memory[worker_info.id, 0] == 0:
+                self.memory[worker_info.id, 0:2] = torch.tensor([rss, private],
+                                                                dtype=torch.float64)
+            self.memory[worker_info.id, 2:4] = torch.tensor([rss, private], dtype=torch.float64)
+        return item
+
+
+def generate_linked_imagefolder(root: str, num_images: int, num_classes: int) -> str:
+    """Image folder of hard links to a few small images, cheap to create with millions of files"""
+    marker = os.path.join(root, ".linked.json")
+    settings = {"num_images": num_images, "num_classes": num_classes}
+    if os.path.isfile(marker):
+        with open(marker, encoding="utf-8") as file:
+            if json.load(file) == settings:
+                return root
+    synthetic.generate_dataset(f"{root}_source", dataset_type="imagefolder",
+                               num_images=num_classes, image_size=(32, 32),
+                               num_classes=num_classes)
+    for label in range(num_classes):
+        class_name = f"class_{label:03d}"
+        source = os.path.join(f"{root}_source", class_name, f"{label:06d}.jpg")
+        os.makedirs(os.path.join(root, class_name), exist_ok=True)
+        for index in range(label, num_images, num_classes):
+            # Long file names make the per-sample strings realistically sized
+            target = os.path.join(root, class_name,
+                                  f"sample_image_with_a_long_name_{index:09d}.jpg")
+            if not os.path.exists(target):
+                os.link(source, target)
+    with open(marker, "w", encoding="utf-8") as file:
+        json.dump(settings, file)
+    return root
+
+
+def run_case(dataset_class, root: str, workers: int, batch_size: int) -> dict:
+    """Iterate one shuffled epoch and return the memory growth of every worker"""
+    dataset = dataset_class(root, transform=transforms.Compose([transforms.Resize((32, 32)),
+                                                                transforms.PILToTensor()]))
+    memory = torch.zeros((workers, 4), dtype=torch.float64).share_memory_()
+    loader = DataLoader(_MemoryTrackedDataset(dataset, memory), batch_size=batch_size,
+                        shuffle=True, num_workers=workers)
+    for _ in loader:
+        pass
+
+    memory = memory.numpy()
+    growth = (memory[:, 2:4] - memory[:, 0:2]) / 2 ** 20
+    return {
+        "num_samples": len(dataset),
+        "rss_growth_mb": growth[:, 0].tolist(),
+        "private_growth_mb": growth[:, 1].tolist(),
+        "max_private_growth_mb": float(np.max(growth[:, 1]))
+    }
+
+
+def get_args_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Worker memory growth over one epoch")
+    parser.add_argument("--data-dir", type=str,
+                        default=os.path.join(tempfile.gettempdir(), "simple-torch-training-bench"),
+                        help="Directory for the synthetic dataset - default: %(default)s")
+    parser.add_argument("--datasets", nargs="+", default=list(DATASET_CLASSES),
+                        choices=list(DATASET_CLASSES))
+    parser.add_argument("--num-images", type=int, default=200000)
+    parser.add_argument("--num-classes", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--max-growth-mb", type=float, default=None,
+                        help="Fail if a worker of the fast dataset grows by more than this")
+    parser.add_argument("--output", type=str, default="worker_memory_benchmark.json")
+    return parser
+
+
+def main(args):
+    if not os.path.isfile(_SMAPS_FILE):
+        sys.exit(f"{_SMAPS_FILE} is not available, the benchmark requires Linux")
+    if args.workers <= 0:
+        sys.exit("The benchmark measures worker processes, workers must be > 0")
+
+    root = generate_linked_imagefolder(os.path.join(args.data_dir, "linked_imagefolder"),
+                                       num_images=args.num_images,
+                                       num_classes=args.num_classes)
+    results = []
+    for name in args.datasets:
+        result = run_case(DATASET_CLASSES[name], root, args.workers, args.batch_size)
+        result["dataset"] = name
+        results.append(result)
+        print(f"{name:<14}{result['num_samples']} samples    "
+              f"max private growth per worker {result['max_private_growth_mb']:.1f} MB")
+
+    report = {
+        "environment": {"python": platform.python_version(), "torch": torch.__version__,
+                        "platform": platform.platform(), "cpu_count": os.cpu_count()},
+        "settings": vars(args),
+        "results": results
+    }
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+    print(f"Saved results to {args.output}")
+
+    if args.max_growth_mb is not None:
+        for result in results:
+            if result["dataset"] == "fast" and \
+                    result["max_private_growth_mb"] > args.max_growth_mb:
+                sys.exit(f"Worker memory grew by {result['max_private_growth_mb']:.1f} MB, "
+                         f"more than {args.max_growth_mb} MB")
+
+
+if __name__ == '__main__':
+    main(get_args_parser().parse_args())
@@ -1,9 +1,9 @@
-import os
+from __future__ import annotations
 
-import torch
-from torchvision import models
+import os
 
-from lib.helpers import constants
+from lib.data.scanner import is_empty
+from lib.helpers import constants, model_registry
 
 
 class ArgsLoader:
@@ -18,6 +18,7 @@ class ArgsLoader:
         self.start_epoch: int = args.start_epoch
         self.method: str = args.method.lower()
         self.amp: bool = args.amp
+        self.channels_last: bool = args.channels_last
         self.eval: bool = args.eval
         self.sync_bn: bool = args.sync_bn
         self.output_dir: str = os.path.abspath(args.output_dir)
@@ -34,7 +35,7 @@ class ArgsLoader:
         self.data_train: str = args.data_train
         self.data_val: str = args.data_val
         self.batch_size: int = args.batch_size
-        self.workers: int = args.workers
+        self.workers: int | str = args.workers
         self.cache_dataset: bool = args.cache_dataset
 
         # Model
@@ -48,7 +49,11 @@ class ArgsLoader:
         self.__verify()
 
     def __verify_cuda(self):
-        if self.cuda and not torch.cuda.is_available():
+        if not self.cuda:
+            return
+        # Imported lazily, so parsing and verifying args stays fast
+        import torch
+        if not torch.cuda.is_available():
             raise ValueError("CUDA ist not available!")
 
     def __verify_epochs(self):
@@ -80,7 +85,7 @@ class ArgsLoader:
             raise FileNotFoundError("The specified train data path does not exist!")
         if not os.path.isdir(train_path):
             raise NotADirectoryError("The specified train data path is not a directory!")
-        if len(os.listdir(train_path)) == 0:
+        if is_empty(train_path):
             raise FileNotFoundError("The specified train data path is empty!")
 
     def __verify_data_val(self):
@@ -89,7 +94,7 @@ class ArgsLoader:
             raise FileNotFoundError("The specified val data path does not exist!")
         if not os.path.isdir(val_path):
             raise NotADirectoryError("The specified val data path is not a directory!")
-        if len(os.listdir(val_path)) == 0:
+        if is_empty(val_path):
             raise FileNotFoundError("The specified val data path is empty!")
 
     def __verify_batch_size(self):
@@ -97,18 +102,24 @@ class ArgsLoader:
             raise ValueError("Batch size cannot be <= 0!")
 
     def __verify_workers(self):
+        if self.workers == "auto":
+            return
         if self.workers <= 0:
             raise ValueError("Workers cannot be <= 0!")
 
     def __verify_model(self):
         if self.torch_hub_repo:
-            if self.model not in torch.hub.list(self.torch_hub_repo):
+            hub_models = model_registry.get_hub_models(self.torch_hub_repo)
+            # Without a cached listing and network the hub repo is checked when loading the model
+            if hub_models is not None and self.model not in hub_models:
                 raise ValueError("Specified model name not in models list of torch hub repo!")
-        if self.model not in constants.TORCH_MODELS:
+            return
+        if self.model not in model_registry.get_torchvision_models():
             raise ValueError("Specified model name not in torchvision models list!")
 
     def __verify_weights_enum(self):
         if self.weights_enum:
+            from torchvision import models
             try:
                 models.get_weight(self.weights_enum)
             except ValueError as exc:
@@ -1,5 +1,14 @@
 """Module returning the ArgumentParser"""
-from argparse import ArgumentParser
+from argparse import ArgumentParser, ArgumentTypeError
+
+
+def _workers_type(value: str):
+    if value.lower() == "auto":
+        return "auto"
+    try:
+        return int(value)
+    except ValueError as exc:
+        raise ArgumentTypeError("Workers must be an integer or auto") from exc
 
 
 def get_args_parser(add_help=True) -> ArgumentParser:
@@ -77,9 +86,10 @@ def get_args_parser(add_help=True) -> ArgumentParser:
     parser.add_argument(
         "--workers",
         default=16,
-        type=int,
+        type=_workers_type,
         metavar="N",
-        help="Number of data loading workers - default: %(default)s"
+        help="Number of data loading workers or auto to probe the fastest number of workers "
+             "and prefetch depth - default: %(default)s"
     )
     parser.add_argument(
         "--output-dir",
@@ -102,7 +112,7 @@ def get_args_parser(add_help=True) -> ArgumentParser:
     )
     parser.add_argument(
         "--cache-dataset",
-        help="Cache the datasets for quicker initialization. It also serializes the transforms",
+        help="Pack the datasets into memory-mapped shards for quicker initialization and loading",
         action="store_true",
     )
     parser.add_argument(
@@ -118,7 +128,12 @@ def get_args_parser(add_help=True) -> ArgumentParser:
     parser.add_argument(
         "--amp",
         action="store_true",
-        help="Use torch.cuda.amp for mixed precision training"
+        help="Use mixed precision training - float16 on CUDA, bfloat16 on CPU"
+    )
+    parser.add_argument(
+        "--channels-last",
+        action="store_true",
+        help="Use the channels_last memory format for model and inputs"
     )
     parser.add_argument(
         "--weights-enum",
@@ -42,8 +42,18 @@ class DataConfig(ConfigLoader):
         self.repeated_aug: bool = self.get_bool("CROP", "RepeatedAugmentation")
         self.repeated_aug_reps: int = self.get_int("CROP", "RepeatedAugmentationReps")
 
+        # Batch augmentation
+        self.batch_augment: bool = self.get_bool("BATCH_AUGMENT", "BatchAugmentation", False)
+        self.decode_size: tuple = self.get_tuple("BATCH_AUGMENT", "DecodeSize")
+
+        # Decoding
+        self.draft_decode: bool = self.get_bool("DECODE", "DraftDecode", False)
+
+        # Cache
+        self.eval_cache: bool = self.get_bool("CACHE", "EvalTransformCache", False)
+
         # Other
-        self.random_erase_prob: float = self.get_float("AUGMENTATION", "RandomErase")
+        self.random_erase_prob: float = self.get_float("OTHER", "RandomErase")
 
         self.__verify()
 
@@ -59,6 +69,18 @@ class DataConfig(ConfigLoader):
             raise ValueError("Interpolation mode must be one of: "
                              f"{', '.join(constants.INTERPOLATION_MODES)}")
 
+    def __verify_eval_cache(self):
+        if self.eval_cache and not (self.crop and self.eval_crop_size):
+            raise ValueError("Eval transform cache requires cropping to a fixed eval crop size!")
+
+    def __verify_batch_augment(self):
+        if self.batch_augment and not self.decode_size:
+            raise ValueError("Batch augmentation requires a decode size!")
+        if self.batch_augment and not (self.crop and self.train_crop_size):
+            raise ValueError("Batch augmentation requires a train crop size!")
+
     def __verify(self):
         self.__verify_auto_augment()
         self.__verify_interpolation_mode()
+        self.__verify_eval_cache()
+        self.__verify_batch_augment()
@@ -36,10 +36,11 @@ class HypConfig(ConfigLoader):
 
         # Distributed
         self.world_size: int = self.get_int("DISTRIBUTED", "WorldSize")
-        self.warmup_method: str = self.get_str("DISTRIBUTED", "Url")
+        self.dist_url: str = self.get_str("DISTRIBUTED", "Url")
         self.ema: bool = self.get_bool("DISTRIBUTED", "EMA")
         self.ema_steps: int = self.get_int("DISTRIBUTED", "EmaSteps")
         self.ema_decay: float = self.get_float("DISTRIBUTED", "EmaDecay")
+        self.ema_cpu_offload: bool = self.get_bool("DISTRIBUTED", "EmaCpuOffload")
 
         self.__verify()
 
@@ -52,6 +53,21 @@ class HypConfig(ConfigLoader):
             raise ValueError("Scheduler type must be one of: "
                              f"{', '.join(constants.SCHEDULER_TYPES)}")
 
+    def __verify_warmup_method(self):
+        if self.warmup_epochs and self.warmup_method not in constants.WARMUP_METHODS:
+            raise ValueError("Warmup method must be one of: "
+                             f"{', '.join(constants.WARMUP_METHODS)}")
+
+    def __verify_ema(self):
+        if not self.ema:
+            return
+        if self.ema_decay is None or not 0 < self.ema_decay < 1:
+            raise ValueError("EmaDecay must be between 0 and 1")
+        if self.ema_steps is None or self.ema_steps < 1:
+            raise ValueError("EmaSteps must be a positive integer")
+
     def __verify(self):
         self.__verify_optimizer()
         self.__verify_scheduler_type()
+        self.__verify_warmup_method()
+        self.__verify_ema()
@@ -18,6 +18,7 @@ class LoggingConfig(ConfigLoader):
         self.log_model_overview: bool = self.get_bool("GENERAL", "LogModelOverview")
         self.log_hyperparams: bool = self.get_bool("GENERAL", "LogHyperparams")
         self.log_data: bool = self.get_bool("GENERAL", "LogData")
+        self.profile: bool = self.get_bool("GENERAL", "Profile", fallback=False)
 
         # Training
         self.print_freq_train: int = self.get_int("TRAINING", "PrintFrequency")
@@ -28,8 +29,9 @@ class LoggingConfig(ConfigLoader):
         self.tb_log_type_eval: str = self.get_str("EVALUATION", "TensorboardLogType")
 
         # Checkpoint
-        self.ckpt_save_type: str = self.get_str("CHECKPOINT", "SaveType")
+        self.ckpt_save_type: str = self.get_str("CHECKPOINT", "SaveType", fallback="none")
         self.last_n_ckpts: int = self.get_int("CHECKPOINT", "KeepLastNCheckpoints")
+        self.save_every_n_steps: int = self.get_int("CHECKPOINT", "SaveEveryNSteps")
 
         self.__verify()
 
@@ -57,13 +59,18 @@ class LoggingConfig(ConfigLoader):
                              f"{', '.join(constants.CKPT_SAVE_TYPES)}")
 
     def __verify_last_n_ckpts(self):
-        if self.ckpt_save_type == "LastN":
-            if self.last_n_ckpts <= 0:
+        if self.ckpt_save_type == "lastn":
+            if not self.last_n_ckpts or self.last_n_ckpts <= 0:
                 raise ValueError("Last N Checkpoints must be > 0!")
 
+    def __verify_save_every_n_steps(self):
+        if self.save_every_n_steps is not None and self.save_every_n_steps <= 0:
+            raise ValueError("Save every N steps must be > 0!")
+
     def __verify(self):
         self.__verify_print_freq_train()
         self.__verify_print_freq_eval()
         self.__verify_tb_log_type_train()
         self.__verify_ckpt_save_type()
         self.__verify_last_n_ckpts()
+        self.__verify_save_every_n_steps()
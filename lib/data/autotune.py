@@ -0,0 +1,154 @@
+import hashlib
+import json
+import os
+import time
+
+import torch
+
+from .collate import DetectionBatch
+from ..helpers import enums
+
+
+def _get_batch_size(batch) -> int:
+    if isinstance(batch, DetectionBatch):
+        return len(batch)
+    return batch[0].shape[0]
+
+
+def get_tuning_path() -> str:
+    return os.path.expanduser(os.path.join("~", enums.CacheDirNames.ROOT.value,
+                                           enums.CacheFileNames.LOADER_TUNING.value))
+
+
+def load_tuning(fingerprint: str):
+    """Settings tuned before for the fingerprint or None"""
+    tuning_path = get_tuning_path()
+    if not os.path.isfile(tuning_path):
+        return None
+    try:
+        with open(tuning_path, encoding="utf-8") as file:
+            return json.load(file).get(fingerprint)
+    except (OSError, ValueError):
+        return None
+
+
+def save_tuning(fingerprint: str, settings: dict):
+    tuning_path = get_tuning_path()
+    os.makedirs(os.path.dirname(tuning_path), exist_ok=True)
+    tunings = {}
+    if os.path.isfile(tuning_path):
+        try:
+            with open(tuning_path, encoding="utf-8") as file:
+                tunings = json.load(file)
+        except (OSError, ValueError):
+            tunings = {}
+    tunings[fingerprint] = settings
+    temp_path = tuning_path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as file:
+        json.dump(tunings, file, indent=2)
+    os.replace(temp_path, tuning_path)
+
+
+class LoaderTuner:
+    """Searches the number of workers and the prefetch depth with the highest throughput"""
+
+    # A setting has to be at least 5% faster to count as an improvement
+    __PLATEAU_GAIN = 1.05
+    __PREFETCH_FACTORS = (2, 4, 8)
+
+    def __init__(self, data_loader, batch_size: int, cpu_budget: int, probe_batches: int = 20,
+                 probe_seconds: float = 3.):
+        """Constructor for LoaderTuner"""
+
+        self.data_loader = data_loader
+        self.batch_size: int = batch_size
+        self.cpu_budget: int = max(cpu_budget, 1)
+        self.probe_batches: int = probe_batches
+        self.probe_seconds: float = probe_seconds
+        self.probes: list = []
+
+    @staticmethod
+    def get_cpu_budget(local_world_size: int = 1) -> int:
+        """Cores available to the data workers of one process"""
+        if hasattr(os, "sched_getaffinity"):
+            num_cpus = len(os.sched_getaffinity(0))
+        else:
+            num_cpus = os.cpu_count() or 1
+        return max(num_cpus // max(local_world_size, 1), 1)
+
+    def get_fingerprint(self, split_path: str) -> str:
+        dataset = self.data_loader.train_dataset
+        config = {key: value for key, value in vars(self.data_loader.config).items()
+                  if not key.startswith("_")}
+        key = {
+            "split_path": os.path.abspath(split_path),
+            "dataset": type(dataset).__name__,
+            "length": len(dataset),
+            "method": self.data_loader.method,
+            "batch_size": self.batch_size,
+            "cpu_budget": self.cpu_budget,
+            "torch": torch.__version__,
+            "config": config
+        }
+        return hashlib.sha1(json.dumps(key, sort_keys=True, default=str).encode()).hexdigest()
+
+    def probe(self, workers: int, prefetch_factor: int = None) -> float:
+        """Images per second of the training loader, the first batch is not timed"""
+        loader = self.data_loader.get_data_loader(is_train=True,
+                                                  batch_size=self.batch_size,
+                                                  workers=workers,
+                                                  prefetch_factor=prefetch_factor)
+        # Fill the prefetch queue of all workers before measuring the steady state
+        max_batches = max(self.probe_batches, 2 * workers * (prefetch_factor or 1))
+        iterator = iter(loader)
+        next(iterator, None)
+        start = time.perf_counter()
+        num_images = 0
+        for batch_index, batch in enumerate(iterator, 1):
+            num_images += _get_batch_size(batch)
+            if batch_index >= max_batches or time.perf_counter() - start > self.probe_seconds:
+                break
+        duration = time.perf_counter() - start
+        del iterator
+
+        throughput = num_images / duration if duration > 0 else 0.
+        self.probes.append({"workers": workers, "prefetch_factor": prefetch_factor,
+                            "images_per_sec": throughput})
+        return throughput
+
+    def tune(self) -> dict:
+        """Double the workers, then the prefetch depth, until the throughput plateaus
+
+        A single worker is often slower than loading in the main process because of the IPC
+        overhead, so at least two worker counts are probed and each one is compared against the
+        best worker count so far. In-process loading is only kept if no worker count beats it
+        """
+        candidates = []
+        workers = 1
+        while workers < self.cpu_budget:
+            candidates.append(workers)
+            workers *= 2
+        candidates.append(self.cpu_budget)
+
+        in_process = self.probe(0)
+        best_workers, best = 0, 0.
+        for num_probed, workers in enumerate(candidates, 1):
+            throughput = self.probe(workers, self.__PREFETCH_FACTORS[0])
+            if throughput >= best * self.__PLATEAU_GAIN:
+                best_workers, best = workers, throughput
+            elif num_probed >= 2:
+                break
+
+        best_prefetch = self.__PREFETCH_FACTORS[0]
+        if best <= in_process:
+            best_workers, best_prefetch, best = 0, None, in_process
+
+        if best_workers:
+            for prefetch_factor in self.__PREFETCH_FACTORS[1:]:
+                throughput = self.probe(best_workers, prefetch_factor)
+                if throughput < best * self.__PLATEAU_GAIN:
+                    break
+                best_prefetch, best = prefetch_factor, throughput
+
+        return {"workers": best_workers, "prefetch_factor": best_prefetch,
+                "images_per_sec": best, "probes": self.probes}
@@ -0,0 +1,162 @@
+import math
+
+import torch
+from torch.nn import functional
+
+
+GRID_SAMPLE_MODES = {
+    "nearest": "nearest",
+    "nearest-exact": "nearest",
+    "bicubic": "bicubic"
+}
+
+
+class BatchCompose:
+    """Apply a list of batch transforms in order"""
+
+    def __init__(self, transforms: list):
+        self.transforms: list = transforms
+
+    def __call__(self, images: torch.Tensor) -> torch.Tensor:
+        for transform in self.transforms:
+            images = transform(images)
+        return images
+
+
+class BatchToFloat:
+    """Convert a uint8 image batch to float in [0, 1]"""
+
+    def __call__(self, images: torch.Tensor) -> torch.Tensor:
+        if images.is_floating_point():
+            return images
+        return images.float().div_(255)
+
+
+class BatchNormalize:
+    """Convert a uint8 image batch to float and normalize it in one vectorized step"""
+
+    def __init__(self, mean: tuple = None, std: tuple = None):
+        self.mean = None if mean is None else torch.tensor(mean).view(1, -1, 1, 1)
+        self.std = None if std is None else torch.tensor(std).view(1, -1, 1, 1)
+
+    def __call__(self, images: torch.Tensor) -> torch.Tensor:
+        images = BatchToFloat()(images)
+        if self.mean is not None and self.std is not None:
+            mean = self.mean.to(images.device)
+            std = self.std.to(images.device)
+            images = (images - mean).div_(std)
+        return images
+
+
+class BatchRandomResizedCrop:
+    """Random resized crop with per-sample parameters, applied with a single grid sample"""
+
+    def __init__(self, size: tuple, scale: tuple = (0.08, 1.0), ratio: tuple = (3 / 4, 4 / 3),
+                 interpolation: str = "bilinear"):
+        self.size: tuple = (int(size[0]), int(size[-1]))
+        self.scale: tuple = scale
+        self.log_ratio: tuple = (math.log(ratio[0]), math.log(ratio[1]))
+        self.mode: str = GRID_SAMPLE_MODES.get(interpolation, "bilinear")
+
+    def __call__(self, images: torch.Tensor) -> torch.Tensor:
+        batch_size, _, height, width = images.shape
+        device = images.device
+
+        area = torch.empty(batch_size, device=device).uniform_(*self.scale)
+        log_ratio = torch.empty(batch_size, device=device).uniform_(*self.log_ratio)
+        aspect_ratio = torch.exp(log_ratio) * height / width
+
+        # Crop width and height as fraction of the input, shrunk by a common factor to fit the
+        # image, so the sampled aspect ratio is kept
+        crop_w = torch.sqrt(area * aspect_ratio)
+        crop_h = torch.sqrt(area / aspect_ratio)
+        overflow = torch.maximum(crop_w, crop_h).clamp_(min=1.0)
+        crop_w /= overflow
+        crop_h /= overflow
+
+        # Crop centers in normalized [-1, 1] coordinates
+        center_x = (torch.rand(batch_size, device=device) * 2 - 1) * (1 - crop_w)
+        center_y = (torch.rand(batch_size, device=device) * 2 - 1) * (1 - crop_h)
+
+        theta = torch.zeros(batch_size, 2, 3, device=device)
+        theta[:, 0, 0] = crop_w
+        theta[:, 0, 2] = center_x
+        theta[:, 1, 1] = crop_h
+        theta[:, 1, 2] = center_y
+
+        grid = functional.affine_grid(theta, [batch_size, images.shape[1], *self.size],
+                                      align_corners=False)
+        return functional.grid_sample(images, grid.to(images.dtype), mode=self.mode,
+                                      padding_mode="reflection", align_corners=False)
+
+
+class BatchHorizontalFlip:
+    """Flip a random subset of the batch horizontally"""
+
+    def __init__(self, prob: float = 0.5):
+        self.prob: float = prob
+
+    def __call__(self, images: torch.Tensor) -> torch.Tensor:
+        flip = torch.rand(images.shape[0], device=images.device) < self.prob
+        return torch.where(flip.view(-1, 1, 1, 1), images.flip(-1), images)
+
+
+class BatchColorJitter:
+    """Per-sample brightness, contrast and saturation changes on float images in [0, 1]"""
+
+    def __init__(self, brightness: float = 0.0, contrast: float = 0.0, saturation: float = 0.0):
+        self.brightness: float = brightness
+        self.contrast: float = contrast
+        self.saturation: float = saturation
+
+    @staticmethod
+    def __factors(strength: float, images: torch.Tensor) -> torch.Tensor:
+        factors = torch.empty(images.shape[0], 1, 1, 1, device=images.device, dtype=images.dtype)
+        return factors.uniform_(1 - strength, 1 + strength)
+
+    @staticmethod
+    def __grayscale(images: torch.Tensor) -> torch.Tensor:
+        return (0.299 * images[:, 0:1] + 0.587 * images[:, 1:2] + 0.114 * images[:, 2:3])
+
+    def __call__(self, images: torch.Tensor) -> torch.Tensor:
+        if self.brightness > 0:
+            images = images * self.__factors(self.brightness, images)
+        if self.contrast > 0:
+            mean = self.__grayscale(images).mean(dim=(1, 2, 3), keepdim=True)
+            images = torch.lerp(mean.expand_as(images), images,
+                                self.__factors(self.contrast, images))
+        if self.saturation > 0:
+            gray = self.__grayscale(images)
+            images = torch.lerp(gray.expand_as(images), images,
+                                self.__factors(self.saturation, images))
+        return images.clamp_(0, 1)
+
+
+class BatchRandomErasing:
+    """Erase one random rectangle in a random subset of the batch"""
+
+    def __init__(self, prob: float, scale: tuple = (0.02, 0.33), ratio: tuple = (0.3, 3.3),
+                 value: float = 0.0):
+        self.prob: float = prob
+        self.scale: tuple = scale
+        self.log_ratio: tuple = (math.log(ratio[0]), math.log(ratio[1]))
+        self.value: float = value
+
+    def __call__(self, images: torch.Tensor) -> torch.Tensor:
+        batch_size, _, height, width = images.shape
+        device = images.device
+
+        area = torch.empty(batch_size, device=device).uniform_(*self.scale) * height * width
+        aspect_ratio = torch.exp(torch.empty(batch_size, device=device).uniform_(*self.log_ratio))
+        erase_h = torch.sqrt(area * aspect_ratio).clamp_(max=height)
+        erase_w = torch.sqrt(area / aspect_ratio).clamp_(max=width)
+        top = torch.rand(batch_size, device=device) * (height - erase_h)
+        left = torch.rand(batch_size, device=device) * (width - erase_w)
+
+        rows = torch.arange(height, device=device).view(1, -1, 1)
+        cols = torch.arange(width, device=device).view(1, 1, -1)
+        mask = (rows >= top.view(-1, 1, 1)) & (rows < (top + erase_h).view(-1, 1, 1)) & \
+               (cols >= left.view(-1, 1, 1)) & (cols < (left + erase_w).view(-1, 1, 1))
+        mask &= (torch.rand(batch_size, device=device) < self.prob).view(-1, 1, 1)
+
+        return images.masked_fill(mask.unsqueeze(1), self.value)
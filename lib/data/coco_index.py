@@ -0,0 +1,107 @@
+import os
+import json
+
+import numpy as np
+
+from .index_files import load_index, save_index
+from .scanner import StringTable
+from ..helpers import enums
+
+
+class CocoAnnotationIndex:
+    """Ragged, offset based store of all COCO annotations of one annotation file"""
+
+    __ARRAYS = ("image_ids", "widths", "heights", "offsets", "boxes", "category_ids", "areas",
+                "iscrowd")
+
+    def __init__(self, **arrays):
+        self.image_ids: np.ndarray = arrays["image_ids"]
+        self.file_names: StringTable = arrays["file_names"]
+        self.widths: np.ndarray = arrays["widths"]
+        self.heights: np.ndarray = arrays["heights"]
+        self.offsets: np.ndarray = arrays["offsets"]
+        self.boxes: np.ndarray = arrays["boxes"]
+        self.category_ids: np.ndarray = arrays["category_ids"]
+        self.areas: np.ndarray = arrays["areas"]
+        self.iscrowd: np.ndarray = arrays["iscrowd"]
+
+    @staticmethod
+    def get_index_path(ann_file: str):
+        return f"{os.path.splitext(ann_file)[0]}{enums.CacheFileNames.COCO_INDEX.value}"
+
+    @staticmethod
+    def __get_source_stamp(ann_file: str):
+        stat = os.stat(ann_file)
+        return np.asarray([stat.st_mtime_ns, stat.st_size], dtype=np.int64)
+
+    @classmethod
+    def load_or_build(cls, ann_file: str):
+        """Load the cached index of the annotation file, rebuild it if the file changed"""
+        index_path = cls.get_index_path(ann_file)
+        source_stamp = cls.__get_source_stamp(ann_file)
+
+        def is_valid(index: dict) -> bool:
+            names = cls.__ARRAYS + ("source_stamp", "file_name_data", "file_name_offsets")
+            return set(names).issubset(index) and \
+                np.array_equal(index["source_stamp"], source_stamp)
+
+        index = load_index(index_path, is_valid)
+        if index is not None:
+            file_names = StringTable(index["file_name_data"], index["file_name_offsets"])
+            return cls(file_names=file_names, **{name: index[name] for name in cls.__ARRAYS})
+
+        coco_index = cls.build(ann_file)
+        save_index(index_path, source_stamp=source_stamp,
+                   file_name_data=coco_index.file_names.data,
+                   file_name_offsets=coco_index.file_names.offsets,
+                   **{name: getattr(coco_index, name) for name in cls.__ARRAYS})
+        return coco_index
+
+    @classmethod
+    def build(cls, ann_file: str):
+        """Convert the annotation json into flat numpy columns"""
+        with open(ann_file, "r", encoding="utf-8") as json_file:
+            dataset = json.load(json_file)
+
+        images = sorted(dataset["images"], key=lambda image: image["id"])
+        image_ids = np.asarray([image["id"] for image in images], dtype=np.int64)
+        annotations = dataset.get("annotations", [])
+
+        ann_image_ids = np.asarray([ann["image_id"] for ann in annotations], dtype=np.int64)
+        boxes = np.asarray([ann["bbox"] for ann in annotations], dtype=np.float32).reshape(-1, 4)
+        category_ids = np.asarray([ann["category_id"] for ann in annotations], dtype=np.int64)
+        areas = np.asarray([ann.get("area", 0.0) for ann in annotations], dtype=np.float32)
+        iscrowd = np.asarray([ann.get("iscrowd", 0) for ann in annotations], dtype=np.uint8)
+
+        # Group annotations by image position, dropping annotations of unknown images
+        positions = np.searchsorted(image_ids, ann_image_ids)
+        known = np.zeros(len(ann_image_ids), dtype=bool)
+        if len(image_ids):
+            positions = np.minimum(positions, len(image_ids) - 1)
+            known = image_ids[positions] == ann_image_ids
+        order = np.argsort(positions[known], kind="stable")
+        positions = positions[known][order]
+
+        # Convert xywh to xyxy
+        boxes = boxes[known][order]
+        boxes[:, 2:] += boxes[:, :2]
+
+        offsets = np.zeros(len(image_ids) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(positions, minlength=len(image_ids)))
+
+        return cls(image_ids=image_ids,
+                   file_names=StringTable.from_list([image["file_name"] for image in images]),
+                   widths=np.asarray([image.get("width", 0) for image in images], dtype=np.int64),
+                   heights=np.asarray([image.get("height", 0) for image in images], dtype=np.int64),
+                   offsets=offsets,
+                   boxes=boxes,
+                   category_ids=category_ids[known][order],
+                   areas=areas[known][order],
+                   iscrowd=iscrowd[known][order])
+
+    def get(self, index: int):
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return self.boxes[start:end], self.category_ids[start:end]
+
+    def __len__(self):
+        return len(self.image_ids)
@@ -0,0 +1,75 @@
+import torch
+from torch.utils.data import get_worker_info
+
+
+class DetectionBatch:
+    """Detection batch with images padded into one buffer and flat, offset indexed targets"""
+
+    def __init__(self, images: torch.Tensor, image_sizes: torch.Tensor, boxes: torch.Tensor,
+                 labels: torch.Tensor, offsets: torch.Tensor):
+        self.images: torch.Tensor = images
+        self.image_sizes: torch.Tensor = image_sizes
+        self.boxes: torch.Tensor = boxes
+        self.labels: torch.Tensor = labels
+        self.offsets: torch.Tensor = offsets
+
+    def pin_memory(self):
+        # Called by torch.utils.data.DataLoader when pin_memory is enabled
+        return DetectionBatch(self.images.pin_memory(), self.image_sizes.pin_memory(),
+                              self.boxes.pin_memory(), self.labels.pin_memory(),
+                              self.offsets.pin_memory())
+
+    def to(self, device, non_blocking: bool = False):
+        return DetectionBatch(self.images.to(device, non_blocking=non_blocking),
+                              self.image_sizes,
+                              self.boxes.to(device, non_blocking=non_blocking),
+                              self.labels.to(device, non_blocking=non_blocking),
+                              self.offsets)
+
+    def __len__(self):
+        return self.images.shape[0]
+
+
+def _new_buffer(like: torch.Tensor, shape: tuple) -> torch.Tensor:
+    if get_worker_info() is None:
+        return like.new_zeros(shape)
+    # Inside a worker allocate in shared memory, so the batch is not copied again when sent
+    numel = 1
+    for size in shape:
+        numel *= size
+    storage = like.storage()._new_shared(numel)
+    return like.new(storage).resize_(shape).zero_()
+
+
+def detection_collate(batch) -> DetectionBatch:
+    """Collate (image, boxes, labels) samples into a padded, ragged DetectionBatch"""
+    images, boxes, labels = zip(*batch)
+
+    image_sizes = torch.tensor([image.shape[-2:] for image in images], dtype=torch.int64)
+    max_height, max_width = image_sizes.max(dim=0).values.tolist()
+
+    padded = _new_buffer(images[0], (len(images), images[0].shape[0], max_height, max_width))
+    for index, image in enumerate(images):
+        padded[index, :, :image.shape[-2], :image.shape[-1]].copy_(image)
+
+    offsets = torch.zeros(len(boxes) + 1, dtype=torch.int32)
+    offsets[1:] = torch.cumsum(torch.tensor([len(b) for b in boxes], dtype=torch.int32), dim=0)
+
+    return DetectionBatch(images=padded,
+                          image_sizes=image_sizes,
+                          boxes=torch.cat(boxes).reshape(-1, 4),
+                          labels=torch.cat(labels),
+                          offsets=offsets)
+
+
+def unpack_images(batch: DetectionBatch) -> list:
+    """Per-image views into the padded image buffer"""
+    return [batch.images[index, :, :height, :width]
+            for index, (height, width) in enumerate(batch.image_sizes.tolist())]
+
+
+def unpack_targets(batch: DetectionBatch) -> list:
+    """Per-image target dicts as expected by torchvision detection models"""
+    offsets = batch.offsets.tolist()
+    return [{"boxes": batch.boxes[start:end], "labels": batch.labels[start:end]}
+            for start, end in zip(offsets[:-1], offsets[1:])]
@@ -1,37 +1,32 @@
-import torch
-import numpy as np
-from torchvision.datasets import VisionDataset, CocoDetection
-from PIL import Image
+import os
+
+from torchvision.datasets import VisionDataset
+
+from .coco_index import CocoAnnotationIndex
+from .detection_pipeline import DetectionPipeline
 
 
 class CustomCocoDetection(VisionDataset):
     def __init__(self, root, transform=None):
         super().__init__(root, transform)
+        self.pipeline = DetectionPipeline(transform)
         self.ann_file = f"{root}.json"
-        self.coco = CocoDetection(root=self.root, annFile=self.ann_file)
+        self.index = CocoAnnotationIndex.load_or_build(self.ann_file)
+        self.ids = self.index.image_ids
+        # COCO category ids start at 1, id 0 is used as background
+        self.num_classes = int(self.index.category_ids.max(initial=0)) + 1
 
     def __getitem__(self, index):
-        image, target = self.coco[index]
-
-        boxes = [b["bbox"] for b in target]
-        labels = [b["category_id"] for b in target]
-
-        if self.transform:
-            bgr_image = np.flip(image, -1)
-            transformed = self.transform(bgr_image)
-            bgr_image = transformed["image"]
-            rgb_image = np.flip(bgr_image, -1)
-            image = Image.fromarray(rgb_image, "RGB")
-            boxes = transformed["bboxes"]
-            labels = transformed["class_labels"]
+        image_path, boxes, labels = self.get_raw_sample(index)
+        image = self.pipeline.decode(image_path)
+        return self.pipeline(image, boxes, labels)
 
-        # Convert boxes to tensor
-        boxes = torch.tensor(boxes, dtype=torch.float32)
-
-        # Convert labels to tensor
-        labels = torch.tensor(labels, dtype=torch.int64)
+    def __len__(self):
+        return len(self.ids)
 
-        return image, boxes, labels
+    def get_image_sizes(self):
+        return self.index.heights, self.index.widths
 
-    def __len__(self):
-        return len(self.coco)
+    def get_raw_sample(self, index):
+        boxes, labels = self.index.get(index)
+        return os.path.join(self.root, self.index.file_names[index]), boxes, labels
@@ -1,67 +1,32 @@
 import os
-import xml.etree.ElementTree as Et
-import torch
-import numpy as np
 from torchvision.datasets import VisionDataset
-from PIL import Image
+
+from .detection_pipeline import DetectionPipeline
+from .voc_index import VocAnnotationIndex
 
 
 class CustomVocDetection(VisionDataset):
-    def __init__(self, root: str, transform=None):
+    def __init__(self, root: str, transform=None, update_vocabulary: bool = True):
         super().__init__(root, transform)
-        self.ids = self.__get_ids()
+        self.pipeline = DetectionPipeline(transform)
+        # All splits share one vocabulary, only the train split adds classes to it
+        self.index = VocAnnotationIndex.load_or_build(root, update_vocabulary=update_vocabulary)
+        self.ids = self.index.ids
+        self.classes = self.index.classes
+        # Label ids start at 1 like for COCO, id 0 is used as background
+        self.num_classes = len(self.classes) + 1
 
     def __getitem__(self, index):
-        image_id = self.ids[index]
-        boxes, labels = self.__get_annotation(image_id)
-
-        image_path = os.path.join(self.root, f"{image_id}.jpg")
-        image = Image.open(image_path).convert("RGB")
-
-        if self.transform:
-            bgr_image = np.flip(image, -1)
-            transformed = self.transform(bgr_image)
-            bgr_image = transformed["image"]
-            rgb_image = np.flip(bgr_image, -1)
-            image = Image.fromarray(rgb_image, "RGB")
-            boxes = transformed["bboxes"]
-            labels = transformed["class_labels"]
-
-        # Convert boxes to tensor
-        boxes = torch.tensor(boxes, dtype=torch.float32)
-
-        # Convert labels to tensor
-        labels = torch.tensor(labels, dtype=torch.int64)
-
-        return image, boxes, labels
+        image_path, boxes, labels = self.get_raw_sample(index)
+        image = self.pipeline.decode(image_path)
+        return self.pipeline(image, boxes, labels)
 
     def __len__(self):
         return len(self.ids)
 
-    def __get_ids(self):
-        ids = []
-        for f in os.listdir(self.root):
-            file_name = os.path.splitext(f)
-            if file_name[1] == ".jpg":
-                ids.append(file_name[0])
-        return ids
-
-    def __get_annotation(self, image_id):
-        annotation_file = os.path.join(self.root, image_id + '.xml')
-        tree = Et.parse(annotation_file)
-        root = tree.getroot()
-
-        boxes = []
-        labels = []
-
-        for obj in root.findall('object'):
-            label = obj.find('name').text
-            bbox = obj.find('bndbox')
-            x1 = float(bbox.find('xmin').text)
-            y1 = float(bbox.find('ymin').text)
-            x2 = float(bbox.find('xmax').text)
-            y2 = float(bbox.find('ymax').text)
-            boxes.append([x1, y1, x2, y2])
-            labels.append(label)
+    def get_image_sizes(self):
+        return self.index.heights, self.index.widths
 
-        return boxes, labels
+    def get_raw_sample(self, index):
+        boxes, labels = self.index.get(index)
+        return os.path.join(self.root, f"{self.ids[index]}.jpg"), boxes, labels
@@ -1,7 +1,10 @@
 import os
+import json
+import math
 import hashlib
 
 import torch
+from torch.utils import data as torch_data
 from torchvision.transforms import autoaugment, transforms
 
 import albumentations as at
@@ -9,48 +12,210 @@ import cv2
 
 from lib.config_loaders.data_config import DataConfig
 from .datasets import get_custom_dataset_class
+from .custom_voc import CustomVocDetection
+from .packed_shards import PackedShardDataset, update_packed_shard
+from .eval_cache import EvalTransformCache
+from .collate import detection_collate
+from .samplers import GroupedBatchSampler, RepeatedAugmentationSampler, ResumableBatchSampler
+from .decoding import SharedDecodeLoader
+from .batch_transforms import (BatchCompose, BatchToFloat, BatchNormalize, BatchRandomResizedCrop,
+                               BatchHorizontalFlip, BatchColorJitter, BatchRandomErasing)
 
 from ..helpers import decorators, enums, constants
 
+# Smallest area scale of the random resized crops, the default of torchvision
+_MIN_CROP_SCALE = 0.08
+
 
 class DataLoader:
     """Wrapper class for generating multiple dataloaders from config"""
 
-    def __init__(self, custom: bool, device):
+    def __init__(self, custom: bool, device, method: str):
         """Constructor for DataLoader"""
 
         self.config: DataConfig = DataConfig(custom=custom)
-        self.transforms_train = self.__get_transforms_train()
-        self.transforms_eval = self.__get_transforms_eval()
+        self.method: str = method
+        self.transforms_train = None
+        self.transforms_eval = None
+        self.batch_transforms_train = None
+        self.batch_transforms_eval = None
+        self.collate_fn = None
+        self.refresh_transforms()
         self.train_dataset = None
         self.val_dataset = None
         self.__device = device
 
+    def refresh_transforms(self):
+        """Rebuild all transforms from the current config, e.g. after changing config values
+
+        Datasets loaded before keep their transforms
+        """
+        self.transforms_train = self.__get_transforms_train()
+        self.transforms_eval = self.__get_transforms_eval()
+        self.batch_transforms_train = None
+        self.batch_transforms_eval = None
+        self.collate_fn = None
+        if self.__use_batch_augment():
+            self.batch_transforms_train = self.__get_batch_transforms_train()
+        if self.__use_eval_cache():
+            self.batch_transforms_eval = self.__get_batch_transforms_eval()
+        if self.method == "detection":
+            # Detection datasets return uint8 images, torchvision detection models normalize
+            self.batch_transforms_train = BatchToFloat()
+            self.batch_transforms_eval = BatchToFloat()
+            self.collate_fn = detection_collate
+
     @staticmethod
     def get_cache_path(dir_path: str):
-        hashed_path = hashlib.sha1(dir_path.encode()).hexdigest()
+        hashed_path = hashlib.sha1(os.path.abspath(dir_path).encode()).hexdigest()
         cache_path = os.path.join("~", enums.CacheDirNames.ROOT.value,
                                   enums.CacheDirNames.DATASETS.value,
-                                  f"{hashed_path[:10]}.pt")
+                                  hashed_path)
         cache_path = os.path.expanduser(cache_path)
         return cache_path
 
+    def get_config_hash(self, dataset_type: str) -> str:
+        """Hash of the settings the content of a packed shard depends on
+
+        Shards store the encoded images, so the transforms do not invalidate them
+        """
+        key = json.dumps({"method": self.method, "dataset_type": dataset_type}, sort_keys=True)
+        return hashlib.sha1(key.encode()).hexdigest()
+
     @decorators.stop_time
     def load_cached_dataset(self, cache_path: str, is_train: bool = True):
+        """Load dataset from a memory-mapped packed shard"""
+        trans = self.transforms_train if is_train else self.transforms_eval
+        dataset = PackedShardDataset(root=cache_path, transform=trans)
+        dataset.draft_size = self.get_draft_size(is_train)
         if is_train:
-            self.train_dataset, _ = torch.load(cache_path)
+            self.train_dataset = dataset
+        else:
+            self.val_dataset = self.__wrap_eval_cache(dataset)
+
+    def cache_dataset(self, cache_path: str, dataset_type: str, is_train: bool = True) -> dict:
+        """Pack dataset into a shard and read it from there from now on
+
+        An existing shard is only updated with the added, changed and removed files
+        """
+        dataset = self.train_dataset if is_train else self.val_dataset
+        if isinstance(dataset, EvalTransformCache):
+            dataset = dataset.dataset
+        changes = update_packed_shard(dataset, cache_path,
+                                      config_hash=self.get_config_hash(dataset_type))
+        self.load_cached_dataset(cache_path=cache_path, is_train=is_train)
+        return changes
+
+    def get_draft_size(self, is_train: bool):
+        """Smallest image size (height, width) the transforms need, None to decode at full size"""
+        if not self.config.draft_decode or self.method != "classification":
+            return None
+        if is_train and self.__use_batch_augment():
+            size = self.config.decode_size
+        elif is_train and self.config.crop and self.config.train_crop_size:
+            # The smallest random resized crop covers sqrt(min scale) of the image side and is
+            # scaled up to the crop size, so the image needs the crop size divided by that
+            size = [math.ceil(int(side) / math.sqrt(_MIN_CROP_SCALE))
+                    for side in self.config.train_crop_size]
+        elif not is_train and self.config.resize and self.config.eval_resize:
+            # A center crop without resizing depends on the decoded size and is not drafted
+            size = self.config.eval_resize
         else:
-            self.val_dataset, _ = torch.load(cache_path)
+            return None
+        return int(size[0]), int(size[-1])
+
+    def __use_eval_cache(self):
+        return self.config.eval_cache and self.method == "classification"
+
+    def __wrap_eval_cache(self, dataset):
+        if not self.__use_eval_cache():
+            return dataset
+        transform_config = {
+            "resize": self.config.resize,
+            "eval_resize": self.config.eval_resize,
+            "crop": self.config.crop,
+            "eval_crop_size": self.config.eval_crop_size,
+            "interpolation_mode": self.config.interpolation_mode,
+            "draft_size": self.get_draft_size(is_train=False)
+        }
+        digest = getattr(dataset, "digest", None)
+        if digest is None and hasattr(dataset, "get_digest"):
+            digest = dataset.get_digest()
+        if digest is None:
+            # Without a digest of the files, changed images would be read from a stale cache
+            return dataset
+        fingerprint = EvalTransformCache.get_fingerprint(root=dataset.root,
+                                                         length=len(dataset),
+                                                         transform_config=transform_config,
+                                                         digest=digest)
+        cache_dir = os.path.expanduser(os.path.join("~", enums.CacheDirNames.ROOT.value,
+                                                    enums.CacheDirNames.DATASETS.value,
+                                                    f"eval_{fingerprint}"))
+        return EvalTransformCache(dataset, cache_dir=cache_dir,
+                                  image_size=self.config.eval_crop_size)
+
+    def __use_repeated_aug(self):
+        return self.config.repeated_aug and self.config.repeated_aug_reps and \
+            self.method == "classification"
 
-    def cache_dataset(self, dir_path: str, cache_path: str):
-        """Cache dataset"""
-        utils.save_on_master((self.train_dataset, dir_path), cache_path)
+    def __use_batch_augment(self):
+        return self.config.batch_augment and self.method == "classification"
+
+    def __get_transforms_train(self):
+        if self.method == "classification":
+            if self.__use_batch_augment():
+                return self.__get_transforms_classification_decode()
+            return self.__get_transforms_classification_train()
+        return self.__get_transforms_detection_train()
+
+    def __get_transforms_eval(self):
+        if self.method == "classification":
+            return self.__get_transforms_classification_eval(geometry_only=self.__use_eval_cache())
+        return None
+
+    def __get_batch_transforms_eval(self):
+        if self.config.normalize and self.config.norm_mean and self.config.norm_std:
+            return BatchNormalize(self.config.norm_mean, self.config.norm_std)
+        return BatchNormalize()
+
+    def __get_color_strength(self):
+        # Auto augmentation policies are approximated by batch-wise colour jitter
+        if self.config.auto_augment_policy == "randomaugment":
+            return 0.9 * self.config.magnitude / 30
+        if self.config.auto_augment_policy == "augmix":
+            return 0.9 * self.config.severity / 10
+        return 0.5
+
+    def __get_batch_transforms_train(self):
+        trans = [BatchToFloat(),
+                 BatchRandomResizedCrop(self.config.train_crop_size,
+                                        interpolation=self.config.interpolation_mode)]
+        if self.config.hor_flipping and self.config.h_flip_prob > 0:
+            trans.append(BatchHorizontalFlip(self.config.h_flip_prob))
+        if self.config.auto_augment and self.config.auto_augment_policy:
+            strength = self.__get_color_strength()
+            trans.append(BatchColorJitter(brightness=strength, contrast=strength,
+                                          saturation=strength))
+        if self.config.normalize and self.config.norm_mean and self.config.norm_std:
+            trans.append(BatchNormalize(self.config.norm_mean, self.config.norm_std))
+        if self.config.random_erase_prob and self.config.random_erase_prob > 0:
+            trans.append(BatchRandomErasing(self.config.random_erase_prob))
+        return BatchCompose(trans)
+
+    def __get_transforms_classification_decode(self):
+        interpolation = transforms.InterpolationMode(self.config.interpolation_mode)
+        decode_size = [int(self.config.decode_size[0]), int(self.config.decode_size[-1])]
+        return transforms.Compose(transforms=[
+            transforms.Resize(decode_size, interpolation=interpolation),
+            transforms.PILToTensor()
+        ])
 
     def __get_transforms_classification_train(self):
         trans = []
         interpolation = transforms.InterpolationMode(self.config.interpolation_mode)
         if self.config.crop and self.config.train_crop_size:
-            trans.append(transforms.RandomResizedCrop(self.config.train_crop_size,
+            train_crop_size = [int(size) for size in self.config.train_crop_size]
+            trans.append(transforms.RandomResizedCrop(train_crop_size,
                                                       interpolation=interpolation))
         if self.config.hor_flipping and self.config.h_flip_prob > 0:
             trans.append(transforms.RandomHorizontalFlip(self.config.h_flip_prob))
@@ -67,12 +232,12 @@ class DataLoader:
             else:
                 aa_policy = autoaugment.AutoAugmentPolicy(self.config.auto_augment_policy)
                 trans.append(autoaugment.AutoAugment(policy=aa_policy, interpolation=interpolation))
+
+        trans.extend([transforms.PILToTensor(), transforms.ConvertImageDtype(torch.float)])
         if self.config.normalize and self.config.norm_mean and self.config.norm_std:
             trans.append(transforms.Normalize(self.config.norm_mean, self.config.norm_std))
         if self.config.random_erase_prob and self.config.random_erase_prob > 0:
             trans.append(transforms.RandomErasing(self.config.random_erase_prob))
-
-        trans.extend([transforms.PILToTensor(), transforms.ConvertImageDtype(torch.float)])
         return transforms.Compose(transforms=trans)
 
     def __get_transforms_detection_train(self):
@@ -86,33 +251,32 @@ class DataLoader:
             else:
                 height = self.config.train_crop_size[0]
                 width = self.config.train_crop_size[1]
-            trans.append(at.RandomResizedCrop(height=height,
-                                              width=width,
+            trans.append(at.RandomResizedCrop(height=int(height),
+                                              width=int(width),
                                               interpolation=interpolation))
         if self.config.hor_flipping and self.config.h_flip_prob > 0:
-            trans.append(at.HorizontalFlip(self.config.h_flip_prob))
-        if self.config.auto_augment:
-            norm_severity = self.config.severity / 10
+            trans.append(at.HorizontalFlip(p=self.config.h_flip_prob))
 
-        if self.config.normalize and self.config.norm_mean and self.config.norm_std:
-            trans.append(transforms.Normalize(self.config.norm_mean, self.config.norm_std))
-        if self.config.random_erase_prob and self.config.random_erase_prob > 0:
-            trans.append(transforms.RandomErasing(self.config.random_erase_prob))
+        # Runs on the decoded numpy image, tensor conversion is done by the DetectionPipeline
+        return at.Compose(trans, bbox_params=at.BboxParams(format="pascal_voc",
+                                                           label_fields=["class_labels"]))
 
-        trans.extend([transforms.PILToTensor(), transforms.ConvertImageDtype(torch.float)])
-        return transforms.Compose(transforms=trans)
-
-    def __get_transforms_classification_eval(self):
+    def __get_transforms_classification_eval(self, geometry_only: bool = False):
         trans = []
         interpolation = transforms.InterpolationMode(self.config.interpolation_mode)
         if self.config.resize and self.config.eval_resize:
-            trans.append(transforms.Resize(self.config.eval_resize, interpolation=interpolation))
+            eval_resize = [int(size) for size in self.config.eval_resize]
+            trans.append(transforms.Resize(eval_resize, interpolation=interpolation))
         if self.config.crop and self.config.eval_crop_size:
-            trans.append(transforms.CenterCrop(self.config.eval_crop_size))
-        if self.config.normalize and self.config.norm_mean and self.config.norm_std:
-            trans.append(transforms.Normalize(mean=self.config.norm_mean, std=self.config.norm_std))
+            eval_crop_size = [int(size) for size in self.config.eval_crop_size]
+            trans.append(transforms.CenterCrop(eval_crop_size))
+        if geometry_only:
+            # Tensor conversion and normalization are applied batch-wise on the cached images
+            return transforms.Compose(transforms=trans)
 
         trans.extend([transforms.PILToTensor(), transforms.ConvertImageDtype(torch.float)])
+        if self.config.normalize and self.config.norm_mean and self.config.norm_std:
+            trans.append(transforms.Normalize(mean=self.config.norm_mean, std=self.config.norm_std))
         return transforms.Compose(transforms=trans)
 
     @decorators.stop_time
@@ -120,7 +284,69 @@ class DataLoader:
         """Load train dataset"""
         trans = self.transforms_train if is_train else self.transforms_eval
         dataset_class = get_custom_dataset_class(dataset_type=dataset_type, method=method)
+        if issubclass(dataset_class, CustomVocDetection):
+            # Val reuses the class ids of the train split instead of numbering its own classes
+            dataset = dataset_class(root=split_path, transform=trans, update_vocabulary=is_train)
+        else:
+            dataset = dataset_class(root=split_path, transform=trans)
+        if hasattr(dataset, "draft_size"):
+            dataset.draft_size = self.get_draft_size(is_train)
         if is_train:
-            self.train_dataset = dataset_class(root=split_path, transform=trans)
+            self.train_dataset = dataset
         else:
-            self.val_dataset = dataset_class(root=split_path, transform=trans)
+            self.val_dataset = self.__wrap_eval_cache(dataset)
+
+    def get_data_loader(self, is_train: bool, batch_size: int, workers: int,
+                        num_replicas: int = 1, rank: int = 0, prefetch_factor: int = None):
+        """Create a torch DataLoader for the train or val dataset"""
+        dataset = self.train_dataset if is_train else self.val_dataset
+        loader_args = {
+            "num_workers": workers,
+            "collate_fn": self.collate_fn,
+            "pin_memory": self.__device.type == "cuda",
+            # Keep workers alive between epochs instead of forking them again for every epoch.
+            # Training workers are forked per epoch, persistent workers would keep the seeds
+            # drawn for the first epoch and a resumed epoch could not repeat its augmentations
+            "persistent_workers": workers > 0 and not is_train
+        }
+        if workers > 0 and prefetch_factor:
+            loader_args["prefetch_factor"] = prefetch_factor
+
+        image_sizes = None
+        if self.method in ("detection", "segmentation") and hasattr(dataset, "get_image_sizes"):
+            image_sizes = dataset.get_image_sizes()
+        if image_sizes is not None:
+            batch_sampler = GroupedBatchSampler(heights=image_sizes[0],
+                                                widths=image_sizes[1],
+                                                batch_size=batch_size,
+                                                shuffle=is_train,
+                                                num_replicas=num_replicas,
+                                                rank=rank)
+        else:
+            batch_sampler = torch_data.BatchSampler(
+                self.__get_sampler(dataset, is_train, num_replicas, rank),
+                batch_size=batch_size,
+                drop_last=False)
+
+        if is_train:
+            # Training batches are resumable mid-epoch, so all randomness is seeded per epoch
+            loader_args["generator"] = torch.Generator()
+            batch_sampler = ResumableBatchSampler(batch_sampler,
+                                                  generator=loader_args["generator"])
+            batch_sampler.set_epoch(0)
+        return torch_data.DataLoader(dataset, batch_sampler=batch_sampler, **loader_args)
+
+    def __get_sampler(self, dataset, is_train: bool, num_replicas: int, rank: int):
+        if is_train and self.__use_repeated_aug():
+            if hasattr(dataset, "loader") and not isinstance(dataset.loader, SharedDecodeLoader):
+                dataset.loader = SharedDecodeLoader(dataset.loader,
+                                                    cache_size=self.config.repeated_aug_reps)
+            return RepeatedAugmentationSampler(len(dataset),
+                                               reps=self.config.repeated_aug_reps,
+                                               num_replicas=num_replicas,
+                                               rank=rank)
+        if num_replicas > 1 or is_train:
+            # A seeded DistributedSampler with a single replica is a reproducible shuffle
+            return torch_data.DistributedSampler(dataset, num_replicas=num_replicas,
+                                                 rank=rank, shuffle=is_train)
+        return torch_data.SequentialSampler(dataset)
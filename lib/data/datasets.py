@@ -1,6 +1,5 @@
-from torchvision import datasets
-
 from configs import custom_dataset
+from .image_folder import FastImageFolder
 from .custom_voc import CustomVocDetection
 from .custom_coco import CustomCocoDetection
 
@@ -8,7 +7,7 @@ from .custom_coco import CustomCocoDetection
 def get_custom_dataset_class(method: str, dataset_type: str):
     if method == "classification":
         if dataset_type == "imagefolder":
-            return datasets.ImageFolder
+            return FastImageFolder
         else:
             return custom_dataset.CustomClassification
     if method == "detection":
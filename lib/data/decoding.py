@@ -0,0 +1,35 @@
+from collections import OrderedDict
+
+from PIL import Image
+
+
+def draft_decode(source, target_size: tuple = None) -> Image.Image:
+    """Decode an image file or file object to RGB
+
+    JPEGs are scaled in the DCT domain while decoding, to the smallest power-of-two scale that
+    is still at least the target size (height, width). Other formats are decoded fully
+    """
+    image = Image.open(source)
+    if target_size is not None:
+        image.draft("RGB", (int(target_size[1]), int(target_size[0])))
+    return image.convert("RGB")
+
+
+class SharedDecodeLoader:
+    """Image loader reusing the most recently decoded images of a worker for repeated samples"""
+
+    def __init__(self, loader, cache_size: int):
+        self.loader = loader
+        self.cache_size: int = cache_size
+        self.__cache: OrderedDict = OrderedDict()
+
+    def __call__(self, key):
+        if key in self.__cache:
+            self.__cache.move_to_end(key)
+            return self.__cache[key]
+
+        image = self.loader(key)
+        self.__cache[key] = image
+        if len(self.__cache) > self.cache_size:
+            self.__cache.popitem(last=False)
+        return image
@@ -0,0 +1,87 @@
+import cv2
+import numpy as np
+import torch
+
+
+class _CountedApply:
+    """Image `apply` of an albumentations transform counting the images it allocates"""
+
+    def __init__(self, apply, pipeline):
+        self.apply = apply
+        self.pipeline = pipeline
+
+    def __call__(self, image, *args, **params):
+        result = self.apply(image, *args, **params)
+        if isinstance(result, np.ndarray) and not np.may_share_memory(image, result):
+            self.pipeline.last_allocations += 1
+        return result
+
+
+def _get_image_transforms(transform) -> list:
+    """Leaf transforms of a possibly nested albumentations Compose"""
+    if hasattr(transform, "transforms"):
+        return [leaf for child in transform.transforms for leaf in _get_image_transforms(child)]
+    return [transform] if hasattr(transform, "apply") else []
+
+
+class DetectionPipeline:
+    """Decode, augment and convert detection samples as numpy arrays without a PIL round-trip"""
+
+    def __init__(self, transform=None):
+        self.transform = transform
+
+        # Full image allocations of the last processed sample, including the decode itself
+        self.last_allocations: int = 0
+        # Every transform allocates at most one image, so a sample needs at most one per transform
+        # plus the decode. Each transform's apply is wrapped to count what it really allocates
+        self.image_transforms: list = _get_image_transforms(transform) if transform else []
+        for image_transform in self.image_transforms:
+            if isinstance(image_transform.apply, _CountedApply):
+                # The transform is shared with an earlier pipeline, e.g. of the uncached dataset
+                image_transform.apply.pipeline = self
+            else:
+                image_transform.apply = _CountedApply(image_transform.apply, self)
+
+    @property
+    def allocation_budget(self) -> int:
+        return 1 + len(self.image_transforms)
+
+    def __to_rgb(self, image, source: str):
+        if image is None:
+            raise FileNotFoundError(f"Could not decode image {source}!")
+        # OpenCV decodes to BGR, convert it to RGB in place
+        rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=image)
+        if not np.may_share_memory(image, rgb):
+            self.last_allocations += 1
+        return rgb
+
+    def decode(self, image_path: str) -> np.ndarray:
+        self.last_allocations = 1
+        return self.__to_rgb(cv2.imread(image_path, cv2.IMREAD_COLOR), image_path)
+
+    def decode_buffer(self, buffer, offset: int, length: int) -> np.ndarray:
+        self.last_allocations = 1
+        encoded = np.frombuffer(buffer, dtype=np.uint8, count=length, offset=offset)
+        return self.__to_rgb(cv2.imdecode(encoded, cv2.IMREAD_COLOR), f"at offset {offset}")
+
+    def __call__(self, image: np.ndarray, boxes, labels):
+        if self.transform:
+            transformed = self.transform(image=image, bboxes=boxes, class_labels=labels)
+            image = transformed["image"]
+            boxes = transformed["bboxes"]
+            labels = transformed["class_labels"]
+
+        contiguous = np.ascontiguousarray(image)
+        if contiguous is not image:
+            self.last_allocations += 1
+
+        # HWC uint8 array to CHW uint8 tensor view, float conversion happens batch-wise
+        image = torch.from_numpy(contiguous).permute(2, 0, 1)
+
+        # Convert boxes to tensor
+        boxes = torch.tensor(np.asarray(boxes, dtype=np.float32).reshape(-1, 4))
+
+        # Convert labels to tensor
+        labels = torch.tensor(np.asarray(labels, dtype=np.int64))
+
+        return image, boxes, labels
@@ -0,0 +1,89 @@
+import os
+import json
+import hashlib
+
+import numpy as np
+import torch
+from torch.utils.data import Dataset
+
+from ..helpers import enums
+
+
+class EvalTransformCache(Dataset):
+    """Memory-mapped cache of the deterministic eval transform results as uint8 images"""
+
+    def __init__(self, dataset, cache_dir: str, image_size: tuple):
+        self.dataset = dataset
+        self.cache_dir: str = cache_dir
+        self.image_shape: tuple = (3, int(image_size[0]), int(image_size[-1]))
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self.__paths = {
+            "images": os.path.join(cache_dir, enums.CacheFileNames.EVAL_IMAGES.value),
+            "labels": os.path.join(cache_dir, enums.CacheFileNames.EVAL_LABELS.value),
+            "filled": os.path.join(cache_dir, enums.CacheFileNames.EVAL_FILLED.value)
+        }
+        self.__shapes = {
+            "images": (len(dataset),) + self.image_shape,
+            "labels": (len(dataset),),
+            "filled": (len(dataset),)
+        }
+        self.__dtypes = {"images": np.uint8, "labels": np.int64, "filled": np.uint8}
+        self.__arrays = None
+
+        # Create the backing files once in the main process, workers only open them
+        if not self.__is_valid():
+            for name, path in self.__paths.items():
+                np.memmap(path, dtype=self.__dtypes[name], mode="w+",
+                          shape=self.__shapes[name]).flush()
+
+    def __is_valid(self):
+        for name, path in self.__paths.items():
+            item_size = np.dtype(self.__dtypes[name]).itemsize
+            if not os.path.isfile(path) or \
+                    os.path.getsize(path) != int(np.prod(self.__shapes[name])) * item_size:
+                return False
+        return True
+
+    @staticmethod
+    def get_fingerprint(root: str, length: int, transform_config: dict, digest: str) -> str:
+        """Fingerprint of the dataset and the eval transform config
+
+        The digest of the dataset files invalidates the cache when files change
+        """
+        key = json.dumps({"root": root, "length": length, "digest": digest, **transform_config},
+                         sort_keys=True)
+        return hashlib.sha1(key.encode()).hexdigest()[:10]
+
+    def __getstate__(self):
+        # The memory maps are reopened lazily in every worker process
+        state = self.__dict__.copy()
+        state["_EvalTransformCache__arrays"] = None
+        return state
+
+    def __get_arrays(self):
+        if self.__arrays is None:
+            self.__arrays = {
+                name: np.memmap(path, dtype=self.__dtypes[name], mode="r+",
+                                shape=self.__shapes[name])
+                for name, path in self.__paths.items()
+            }
+        return self.__arrays
+
+    def __getitem__(self, index):
+        arrays = self.__get_arrays()
+        if not arrays["filled"][index]:
+            image, label = self.dataset[index]
+            image = np.asarray(image, dtype=np.uint8)
+            if image.shape[:2] != self.image_shape[1:]:
+                raise ValueError(f"Eval transforms returned an image of size {image.shape[:2]}, "
+                                 f"expected {self.image_shape[1:]}!")
+            arrays["images"][index] = image.transpose(2, 0, 1)
+            arrays["labels"][index] = label
+            # Mark the entry as valid only after the image has been written
+            arrays["filled"][index] = 1
+
+        return torch.from_numpy(arrays["images"][index]), int(arrays["labels"][index])
+
+    def __len__(self):
+        return len(self.dataset)
@@ -0,0 +1,36 @@
+from torchvision.datasets import VisionDataset
+from torchvision.datasets.folder import IMG_EXTENSIONS
+
+from .decoding import draft_decode
+from .scanner import SampleIndex
+
+
+class FastImageFolder(VisionDataset):
+    """ImageFolder with the samples scanned in parallel and stored in a SampleIndex"""
+
+    def __init__(self, root: str, transform=None, loader=None):
+        super().__init__(root, transform=transform)
+        self.index = SampleIndex.scan(root, IMG_EXTENSIONS)
+        self.classes = self.index.classes
+        self.class_to_idx = {class_name: index for index, class_name in enumerate(self.classes)}
+        self.targets = self.index.targets
+        # Smallest size (height, width) the transforms need, images are decoded at full size if None
+        self.draft_size: tuple = None
+        self.loader = loader or self.decode_image
+
+    def get_digest(self) -> str:
+        return self.index.get_digest()
+
+    def decode_image(self, path: str):
+        with open(path, "rb") as image_file:
+            return draft_decode(image_file, self.draft_size)
+
+    def __getitem__(self, index):
+        path, target = self.index[index]
+        image = self.loader(path)
+        if self.transform:
+            image = self.transform(image)
+        return image, target
+
+    def __len__(self):
+        return len(self.index)
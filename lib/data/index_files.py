@@ -0,0 +1,75 @@
+import os
+import json
+import hashlib
+import zipfile
+
+import numpy as np
+
+from ..helpers import enums
+
+
+def get_fallback_path(path: str) -> str:
+    """Location of an index file in the user cache, used if the dataset is not writable"""
+    directory, file_name = os.path.split(os.path.abspath(path))
+    hashed_dir = hashlib.sha1(directory.encode()).hexdigest()
+    return os.path.expanduser(os.path.join("~", enums.CacheDirNames.ROOT.value,
+                                           enums.CacheDirNames.INDEXES.value, hashed_dir,
+                                           file_name))
+
+
+def _get_candidates(path: str) -> tuple:
+    """Locations of an index file, the one that is written to comes first"""
+    if os.access(os.path.dirname(os.path.abspath(path)), os.W_OK):
+        return path, get_fallback_path(path)
+    return get_fallback_path(path), path
+
+
+def _write_atomic(path: str, write_fn) -> str:
+    """Write next to the dataset or to the user cache, the first writable location is used"""
+    for candidate in _get_candidates(path):
+        temp_path = f"{candidate}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(candidate), exist_ok=True)
+            with open(temp_path, "wb") as file:
+                write_fn(file)
+            os.replace(temp_path, candidate)
+            return candidate
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+    # Without any writable location the index is only kept in memory
+    return None
+
+
+def load_index(path: str, is_valid=None):
+    """Arrays of the first readable and valid index next to the dataset or in the user cache
+
+    Missing, truncated and otherwise unreadable files are skipped, so they are rebuilt
+    """
+    for candidate in _get_candidates(path):
+        try:
+            with np.load(candidate) as index:
+                arrays = {name: index[name] for name in index.files}
+        except (OSError, ValueError, EOFError, zipfile.BadZipFile):
+            continue
+        if is_valid is None or is_valid(arrays):
+            return arrays
+    return None
+
+
+def save_index(path: str, **arrays) -> str:
+    return _write_atomic(path, lambda file: np.savez(file, **arrays))
+
+
+def load_json(path: str):
+    for candidate in _get_candidates(path):
+        try:
+            with open(candidate, "r", encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            continue
+    return None
+
+
+def save_json(path: str, data) -> str:
+    return _write_atomic(path, lambda file: file.write(json.dumps(data, indent=2).encode()))
@@ -0,0 +1,271 @@
+import io
+import os
+import hashlib
+import mmap
+import shutil
+import zipfile
+
+import numpy as np
+from torchvision.datasets import VisionDataset, ImageFolder
+
+from .decoding import draft_decode
+from .image_folder import FastImageFolder
+from .scanner import encode_paths, decode_paths, stat_files
+from .custom_voc import CustomVocDetection
+from .custom_coco import CustomCocoDetection
+from .detection_pipeline import DetectionPipeline
+from ..helpers import enums
+
+
+def _iter_raw_samples(dataset):
+    if isinstance(dataset, ImageFolder):
+        for image_path, label in dataset.samples:
+            yield image_path, label, None, None
+    elif isinstance(dataset, FastImageFolder):
+        for index in range(len(dataset)):
+            image_path, label = dataset.index[index]
+            yield image_path, label, None, None
+    elif isinstance(dataset, (CustomVocDetection, CustomCocoDetection)):
+        for index in range(len(dataset)):
+            image_path, boxes, labels = dataset.get_raw_sample(index)
+            yield image_path, -1, boxes, labels
+    else:
+        raise TypeError(f"Datasets of type {type(dataset).__name__} cannot be packed into a shard!")
+
+
+def _get_digest(index: dict) -> str:
+    """Digest of the files a shard was packed from"""
+    digest = hashlib.sha1()
+    for name in ("path_data", "path_offsets", "sizes", "mtimes"):
+        digest.update(index[name].tobytes())
+    return digest.hexdigest()
+
+
+def _load_manifest(shard_dir: str, config_hash: str):
+    """Index of an existing shard, None if it is missing, unreadable or for another config"""
+    index_path = os.path.join(shard_dir, enums.CacheFileNames.SHARD_INDEX.value)
+    data_path = os.path.join(shard_dir, enums.CacheFileNames.SHARD_DATA.value)
+    if not os.path.isfile(data_path):
+        return None
+    try:
+        with np.load(index_path) as index:
+            manifest = {name: index[name] for name in index.files}
+    except (OSError, ValueError, EOFError, zipfile.BadZipFile):
+        return None
+    if "config_hash" not in manifest or str(manifest["config_hash"]) != config_hash:
+        return None
+    return manifest
+
+
+def _collect_samples(dataset) -> dict:
+    """Paths, file stats and targets of all samples, the files are stated in parallel"""
+    image_paths, labels = [], []
+    box_offsets, boxes, box_labels = [0], [], []
+    is_detection = False
+    for image_path, label, sample_boxes, sample_labels in _iter_raw_samples(dataset):
+        image_paths.append(image_path)
+        labels.append(label)
+        if sample_boxes is not None:
+            is_detection = True
+            boxes.extend(sample_boxes)
+            box_labels.extend(sample_labels)
+            box_offsets.append(len(box_labels))
+
+    stats = stat_files(image_paths)
+    samples = {
+        "image_paths": image_paths,
+        "paths": [os.path.relpath(image_path, dataset.root) for image_path in image_paths],
+        "sizes": stats[:, 0],
+        "mtimes": stats[:, 1],
+        "labels": np.asarray(labels, dtype=np.int64)
+    }
+    if is_detection:
+        samples["box_offsets"] = np.asarray(box_offsets, dtype=np.int64)
+        samples["boxes"] = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        samples["box_labels"] = np.asarray(box_labels, dtype=np.int64)
+    return samples
+
+
+def _diff_manifest(manifest: dict, samples: dict) -> tuple:
+    """Manifest row of every unchanged sample or -1, and the number of changed files"""
+    num_samples = len(samples["paths"])
+    if manifest is None:
+        return np.full(num_samples, -1, dtype=np.int64), \
+            {"added": num_samples, "changed": 0, "removed": 0}
+
+    packed = {path: row for row, path in
+              enumerate(decode_paths(manifest["path_data"], manifest["path_offsets"]))}
+    rows = np.asarray([packed.get(path, -1) for path in samples["paths"]], dtype=np.int64)
+    known = rows >= 0
+    unchanged = known.copy()
+    unchanged[known] = (manifest["sizes"][rows[known]] == samples["sizes"][known]) & \
+        (manifest["mtimes"][rows[known]] == samples["mtimes"][known])
+    rows[~unchanged] = -1
+    changes = {
+        "added": int(np.count_nonzero(~known)),
+        "changed": int(np.count_nonzero(known & ~unchanged)),
+        "removed": len(packed) - int(np.count_nonzero(known))
+    }
+    return rows, changes
+
+
+def _append_files(data_path: str, image_paths: list, rows: np.ndarray, manifest: dict) -> tuple:
+    """Offsets and lengths of all samples after appending the new files, and the data size"""
+    offsets = np.zeros(len(rows), dtype=np.int64)
+    lengths = np.zeros(len(rows), dtype=np.int64)
+    reused = rows >= 0
+    if manifest is not None:
+        offsets[reused] = manifest["offsets"][rows[reused]]
+        lengths[reused] = manifest["lengths"][rows[reused]]
+
+    with open(data_path, "ab" if manifest is not None else "wb") as data_file:
+        offset = data_file.tell()
+        for index in np.flatnonzero(~reused).tolist():
+            with open(image_paths[index], "rb") as image_file:
+                shutil.copyfileobj(image_file, data_file)
+            offsets[index] = offset
+            lengths[index] = data_file.tell() - offset
+            offset = data_file.tell()
+    return offsets, lengths, offset
+
+
+def _build_index(dataset, samples: dict, offsets: np.ndarray, lengths: np.ndarray,
+                 config_hash: str) -> dict:
+    index = {
+        "offsets": offsets,
+        "lengths": lengths,
+        "labels": samples["labels"],
+        "sizes": samples["sizes"],
+        "mtimes": samples["mtimes"],
+        "config_hash": np.asarray(config_hash, dtype=np.str_)
+    }
+    index["path_data"], index["path_offsets"] = encode_paths(samples["paths"])
+    index["digest"] = np.asarray(_get_digest(index), dtype=np.str_)
+    if hasattr(dataset, "classes"):
+        index["classes"] = np.asarray(dataset.classes, dtype=np.str_)
+    if hasattr(dataset, "num_classes"):
+        index["num_classes"] = np.asarray(dataset.num_classes, dtype=np.int64)
+    if hasattr(dataset, "get_image_sizes"):
+        index["heights"], index["widths"] = dataset.get_image_sizes()
+    for name in ("box_offsets", "boxes", "box_labels"):
+        if name in samples:
+            index[name] = samples[name]
+    return index
+
+
+def _is_unchanged(manifest: dict, index: dict) -> bool:
+    return manifest is not None and manifest.keys() == index.keys() and \
+        all(np.array_equal(manifest[name], index[name]) for name in index)
+
+
+def write_packed_shard(dataset, shard_dir: str, config_hash: str = "") -> dict:
+    """Pack the encoded images and targets of a dataset into one data file and a numpy index"""
+    return update_packed_shard(dataset, shard_dir, config_hash, incremental=False)
+
+
+def update_packed_shard(dataset, shard_dir: str, config_hash: str = "",
+                        incremental: bool = True) -> dict:
+    """Bring the shard of a dataset up to date, only added or changed images are copied
+
+    The index stores a manifest of the size and mtime of every packed file. Files are matched by
+    their path relative to the dataset root, new data is appended, so the old index stays valid
+    until the new one replaces it. The index is not written at all if nothing changed. Returns
+    the number of added, changed and removed files
+    """
+    os.makedirs(shard_dir, exist_ok=True)
+    data_path = os.path.join(shard_dir, enums.CacheFileNames.SHARD_DATA.value)
+    index_path = os.path.join(shard_dir, enums.CacheFileNames.SHARD_INDEX.value)
+
+    manifest = _load_manifest(shard_dir, config_hash) if incremental else None
+    if manifest is None and os.path.exists(index_path):
+        # Remove a stale index first, so an interrupted write never leaves a valid looking shard
+        os.remove(index_path)
+
+    samples = _collect_samples(dataset)
+    rows, changes = _diff_manifest(manifest, samples)
+    offsets, lengths, data_size = _append_files(data_path, samples["image_paths"], rows, manifest)
+
+    # Compact the shard once removed and replaced images take up more than half of it
+    if manifest is not None and data_size > 2 * int(lengths.sum()):
+        return update_packed_shard(dataset, shard_dir, config_hash, incremental=False)
+
+    index = _build_index(dataset, samples, offsets, lengths, config_hash)
+    if _is_unchanged(manifest, index):
+        return changes
+
+    temp_path = f"{index_path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as index_file:
+        np.savez(index_file, **index)
+    os.replace(temp_path, index_path)
+    return changes
+
+
+class PackedShardDataset(VisionDataset):
+    """Dataset reading encoded images from a memory-mapped packed shard"""
+
+    def __init__(self, root: str, transform=None):
+        super().__init__(root, transform=transform)
+        index = np.load(os.path.join(root, enums.CacheFileNames.SHARD_INDEX.value))
+        self.offsets: np.ndarray = index["offsets"]
+        self.lengths: np.ndarray = index["lengths"]
+        self.labels: np.ndarray = index["labels"]
+        self.classes: list = index["classes"].tolist() if "classes" in index.files else []
+        self.digest: str = str(index["digest"]) if "digest" in index.files else None
+        if "num_classes" in index.files:
+            self.num_classes: int = int(index["num_classes"])
+
+        self.image_sizes: tuple = None
+        if "heights" in index.files:
+            self.image_sizes = (index["heights"], index["widths"])
+
+        self.is_detection: bool = "box_offsets" in index.files
+        if self.is_detection:
+            self.box_offsets: np.ndarray = index["box_offsets"]
+            self.boxes: np.ndarray = index["boxes"]
+            self.box_labels: np.ndarray = index["box_labels"]
+            self.pipeline = DetectionPipeline(transform)
+
+        self.__data_path: str = os.path.join(root, enums.CacheFileNames.SHARD_DATA.value)
+        self.__buffer = None
+        self.draft_size: tuple = None
+        self.loader = self.decode_image
+
+    def get_image_sizes(self):
+        return self.image_sizes
+
+    @staticmethod
+    def exists(root: str) -> bool:
+        return os.path.isfile(os.path.join(root, enums.CacheFileNames.SHARD_INDEX.value))
+
+    def __getstate__(self):
+        # The mapping is reopened lazily in every worker process
+        state = self.__dict__.copy()
+        state["_PackedShardDataset__buffer"] = None
+        return state
+
+    def __get_buffer(self):
+        if self.__buffer is None:
+            with open(self.__data_path, "rb") as data_file:
+                self.__buffer = mmap.mmap(data_file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self.__buffer
+
+    def decode_image(self, index: int):
+        offset, length = int(self.offsets[index]), int(self.lengths[index])
+        encoded = self.__get_buffer()[offset:offset + length]
+        return draft_decode(io.BytesIO(encoded), self.draft_size)
+
+    def __getitem__(self, index):
+        offset, length = int(self.offsets[index]), int(self.lengths[index])
+
+        if not self.is_detection:
+            image = self.loader(index)
+            if self.transform:
+                image = self.transform(image)
+            return image, int(self.labels[index])
+
+        start, end = self.box_offsets[index], self.box_offsets[index + 1]
+        image = self.pipeline.decode_buffer(self.__get_buffer(), offset, length)
+        return self.pipeline(image, self.boxes[start:end], self.box_labels[start:end])
+
+    def __len__(self):
+        return len(self.offsets)
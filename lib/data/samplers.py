@@ -0,0 +1,180 @@
+import math
+
+import numpy as np
+import torch
+from torch.utils.data import Sampler
+
+
+def get_padding_ratio(batches: list, heights: np.ndarray, widths: np.ndarray) -> float:
+    """Fraction of the padded batch area that is padding"""
+    padded_area = 0
+    image_area = 0
+    for batch in batches:
+        batch = np.asarray(batch)
+        padded_area += len(batch) * heights[batch].max() * widths[batch].max()
+        image_area += (heights[batch] * widths[batch]).sum()
+    if padded_area == 0:
+        return 0.0
+    return float(1 - image_area / padded_area)
+
+
+class GroupedBatchSampler(Sampler):
+    """Batch sampler forming batches of images within the same aspect ratio quantile"""
+
+    def __init__(self, heights: np.ndarray, widths: np.ndarray, batch_size: int,
+                 num_groups: int = 4, shuffle: bool = True, num_replicas: int = 1, rank: int = 0,
+                 seed: int = 0, drop_last: bool = False):
+        super().__init__(None)
+        self.heights: np.ndarray = np.asarray(heights, dtype=np.int64)
+        self.widths: np.ndarray = np.asarray(widths, dtype=np.int64)
+        self.batch_size: int = batch_size
+        self.shuffle: bool = shuffle
+        self.num_replicas: int = num_replicas
+        self.rank: int = rank
+        self.seed: int = seed
+        self.drop_last: bool = drop_last
+        self.epoch: int = 0
+
+        # Bucket images by aspect ratio quantiles, images without a known size share one bucket
+        aspect_ratios = self.widths / np.maximum(self.heights, 1)
+        edges = np.quantile(aspect_ratios, np.linspace(0, 1, num_groups + 1)[1:-1]) \
+            if len(aspect_ratios) else np.zeros(0)
+        self.group_ids: np.ndarray = np.searchsorted(edges, aspect_ratios, side="right")
+        self.num_groups: int = num_groups
+
+    def set_epoch(self, epoch: int):
+        self.epoch = epoch
+
+    def __get_all_batches(self) -> list:
+        generator = np.random.default_rng(self.seed + self.epoch)
+        batches = []
+        for group_id in range(self.num_groups):
+            indices = np.flatnonzero(self.group_ids == group_id)
+            if self.shuffle:
+                indices = generator.permutation(indices)
+            for start in range(0, len(indices), self.batch_size):
+                batch = indices[start:start + self.batch_size]
+                if len(batch) < self.batch_size and self.drop_last:
+                    continue
+                batches.append(batch.tolist())
+
+        if self.shuffle:
+            batches = [batches[i] for i in generator.permutation(len(batches))]
+
+        # Repeat batches from the start so every rank gets the same number of batches
+        num_batches = math.ceil(len(batches) / self.num_replicas) * self.num_replicas
+        batches += batches[:num_batches - len(batches)]
+        return batches
+
+    def __iter__(self):
+        yield from self.__get_all_batches()[self.rank::self.num_replicas]
+
+    def __len__(self):
+        num_batches = 0
+        for group_id in range(self.num_groups):
+            group_size = int((self.group_ids == group_id).sum())
+            if self.drop_last:
+                num_batches += group_size // self.batch_size
+            else:
+                num_batches += math.ceil(group_size / self.batch_size)
+        return math.ceil(num_batches / self.num_replicas)
+
+    def padding_ratio(self) -> tuple:
+        """Padding ratio of grouped batches compared to randomly formed batches"""
+        grouped = get_padding_ratio(self.__get_all_batches(), self.heights, self.widths)
+        indices = np.random.default_rng(self.seed).permutation(len(self.heights))
+        random_batches = [indices[start:start + self.batch_size]
+                          for start in range(0, len(indices), self.batch_size)]
+        ungrouped = get_padding_ratio(random_batches, self.heights, self.widths)
+        return grouped, ungrouped
+
+
+class RepeatedAugmentationSampler(Sampler):
+    """Distributed sampler repeating every selected image with independent augmentations"""
+
+    def __init__(self, dataset_length: int, reps: int = 3, shuffle: bool = True,
+                 num_replicas: int = 1, rank: int = 0, seed: int = 0):
+        super().__init__(None)
+        self.dataset_length: int = dataset_length
+        self.reps: int = max(reps, 1)
+        self.shuffle: bool = shuffle
+        self.num_replicas: int = num_replicas
+        self.rank: int = rank
+        self.seed: int = seed
+        self.epoch: int = 0
+        self.num_samples: int = math.ceil(dataset_length / num_replicas)
+        self.total_size: int = self.num_samples * num_replicas
+
+    def set_epoch(self, epoch: int):
+        self.epoch = epoch
+
+    def __iter__(self):
+        generator = torch.Generator()
+        generator.manual_seed(self.seed + self.epoch)
+        if self.shuffle:
+            indices = torch.randperm(self.dataset_length, generator=generator)
+        else:
+            indices = torch.arange(self.dataset_length)
+
+        # Select just enough images, so all repetitions together fill one epoch
+        num_selected = math.ceil(self.total_size / self.reps)
+        indices = indices.repeat(math.ceil(num_selected / max(self.dataset_length, 1)))
+        indices = indices[:num_selected].repeat_interleave(self.reps)[:self.total_size]
+
+        # Repetitions of an image that land on the same rank stay adjacent, so they usually
+        # end up in the same batch and worker and can share one decoded image
+        yield from indices[self.rank::self.num_replicas].tolist()
+
+    def __len__(self):
+        return self.num_samples
+
+
+class ResumableBatchSampler(Sampler):
+    """Batch sampler wrapper that can resume an interrupted epoch at the exact batch
+
+    The wrapped samplers shuffle deterministically from their seed and the epoch, so batches
+    consumed before the interruption are skipped as index lists without loading any data
+    """
+
+    def __init__(self, batch_sampler, generator: torch.Generator = None, seed: int = 0):
+        super().__init__(None)
+        self.batch_sampler = batch_sampler
+        self.generator: torch.Generator = generator
+        self.seed: int = seed
+        self.epoch: int = 0
+        self.start_batch: int = 0
+
+    def __get_samplers(self) -> list:
+        return [self.batch_sampler, getattr(self.batch_sampler, "sampler", None)]
+
+    def set_epoch(self, epoch: int):
+        self.epoch = epoch
+        for sampler in self.__get_samplers():
+            if hasattr(sampler, "set_epoch"):
+                sampler.set_epoch(epoch)
+        # The DataLoader draws the worker seeds for augmentations from this generator, which only
+        # reaches the workers if they are started again for every epoch (no persistent workers)
+        if self.generator is not None:
+            self.generator.manual_seed(self.seed + epoch)
+
+    def state_dict(self, batch_index: int) -> dict:
+        return {"epoch": self.epoch, "seed": self.seed, "batch": batch_index}
+
+    def load_state_dict(self, state_dict: dict):
+        self.seed = state_dict["seed"]
+        for sampler in self.__get_samplers():
+            if hasattr(sampler, "seed"):
+                sampler.seed = self.seed
+        self.set_epoch(state_dict["epoch"])
+        self.start_batch = state_dict["batch"]
+
+    def __iter__(self):
+        batches = iter(self.batch_sampler)
+        # Skipping only applies to the first epoch after resuming
+        for _ in range(self.start_batch):
+            next(batches, None)
+        self.start_batch = 0
+        yield from batches
+
+    def __len__(self):
+        return len(self.batch_sampler)
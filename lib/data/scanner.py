@@ -0,0 +1,168 @@
+import os
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Scanning is bound by file system latency, so threads help most on network storage
+SCAN_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+
+def is_empty(path: str) -> bool:
+    """Check a directory for entries without listing all of them"""
+    with os.scandir(path) as entries:
+        return next(entries, None) is None
+
+
+def encode_paths(paths: list) -> tuple:
+    """Paths as one utf-8 buffer and offsets, far smaller than a list or fixed width array"""
+    encoded = [path.encode("utf-8") for path in paths]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(path) for path in encoded])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def decode_paths(path_data: np.ndarray, path_offsets: np.ndarray) -> list:
+    buffer = path_data.tobytes()
+    return [buffer[start:end].decode("utf-8")
+            for start, end in zip(path_offsets[:-1].tolist(), path_offsets[1:].tolist())]
+
+
+def _walk(directory: str, extensions: tuple) -> list:
+    """Sorted paths of all files below a directory, in the order of torchvision's ImageFolder"""
+    files, subdirs = [], []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_dir():
+                subdirs.append(entry.path)
+            elif entry.name.lower().endswith(extensions):
+                files.append(entry.path)
+    paths = sorted(files)
+    for subdir in sorted(subdirs):
+        paths.extend(_walk(subdir, extensions))
+    return paths
+
+
+def scan_files(root: str, extensions: tuple, stat_extensions: tuple = ()) -> dict:
+    """Names without extension of all files directly in root, grouped by extension
+
+    Files with an extension in `stat_extensions` are mapped to their mtime in nanoseconds
+    """
+    files = {extension: [] for extension in extensions}
+    stat_entries = []
+    with os.scandir(root) as entries:
+        for entry in entries:
+            name, extension = os.path.splitext(entry.name)
+            if extension in stat_extensions:
+                stat_entries.append(entry)
+            elif extension in files:
+                files[extension].append(name)
+
+    with ThreadPoolExecutor(max_workers=SCAN_WORKERS) as executor:
+        mtimes = list(executor.map(lambda entry: entry.stat().st_mtime_ns, stat_entries))
+    for extension in stat_extensions:
+        files[extension] = {}
+    for entry, mtime in zip(stat_entries, mtimes):
+        name, extension = os.path.splitext(entry.name)
+        files[extension][name] = mtime
+    for extension in extensions:
+        if extension not in stat_extensions:
+            files[extension].sort()
+    return files
+
+
+def _stat_chunk(paths: list) -> list:
+    stats = []
+    for path in paths:
+        stat = os.stat(path)
+        stats.append((stat.st_size, stat.st_mtime_ns))
+    return stats
+
+
+def stat_files(paths: list, workers: int = SCAN_WORKERS) -> np.ndarray:
+    """Size and mtime in nanoseconds of every file, stated in parallel chunks"""
+    chunk_size = max(1, len(paths) // (max(workers, 1) * 4))
+    chunks = [paths[start:start + chunk_size] for start in range(0, len(paths), chunk_size)]
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        stats = [stat for chunk in executor.map(_stat_chunk, chunks) for stat in chunk]
+    return np.asarray(stats, dtype=np.int64).reshape(-1, 2)
+
+
+class StringTable:
+    """Strings stored as one utf-8 buffer and offsets, without a Python object per string
+
+    Forked dataloader workers only read the two arrays, so their pages stay shared. Lists of
+    strings are copied page by page as soon as a worker touches their reference counts
+    """
+
+    def __init__(self, data: np.ndarray, offsets: np.ndarray):
+        """Constructor for StringTable"""
+
+        self.data: np.ndarray = data
+        self.offsets: np.ndarray = offsets
+
+    @classmethod
+    def from_list(cls, strings: list):
+        return cls(*encode_paths(strings))
+
+    def tolist(self) -> list:
+        return decode_paths(self.data, self.offsets)
+
+    def __getitem__(self, index: int) -> str:
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return self.data[start:end].tobytes().decode("utf-8")
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+
+class SampleIndex:
+    """Sorted sample paths and class ids of an image folder, stored as numpy arrays"""
+
+    def __init__(self, root: str, classes: list, paths: StringTable, targets: np.ndarray):
+        """Constructor for SampleIndex"""
+
+        self.root: str = root
+        self.classes: list = classes
+        self.paths: StringTable = paths
+        self.targets: np.ndarray = targets
+
+    @classmethod
+    def scan(cls, root: str, extensions: tuple, workers: int = SCAN_WORKERS):
+        """Scan the class subdirectories of root in parallel"""
+        with os.scandir(root) as entries:
+            classes = sorted(entry.name for entry in entries if entry.is_dir())
+        if not classes:
+            raise FileNotFoundError(f"Couldn't find any class folder in {root}.")
+
+        extensions = tuple(extension.lower() for extension in extensions)
+        class_dirs = [os.path.join(root, class_name) for class_name in classes]
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+            class_paths = list(executor.map(lambda path: _walk(path, extensions), class_dirs))
+
+        # Paths are stored relative to root, which keeps the buffer small
+        prefix = len(root.rstrip(os.sep)) + 1
+        paths = [path[prefix:] for paths in class_paths for path in paths]
+        if not paths:
+            raise FileNotFoundError(f"Found no valid file for the classes {', '.join(classes)}. "
+                                    f"Supported extensions are: {', '.join(extensions)}")
+        targets = np.repeat(np.arange(len(classes), dtype=np.int64),
+                            [len(paths) for paths in class_paths])
+        return cls(root, classes, StringTable.from_list(paths), targets)
+
+    def get_path(self, index: int) -> str:
+        return os.path.join(self.root, self.paths[index])
+
+    def get_digest(self, workers: int = SCAN_WORKERS) -> str:
+        """Digest of the paths, sizes and mtimes of all files, it changes with any file"""
+        stats = stat_files([self.get_path(index) for index in range(len(self))], workers)
+        digest = hashlib.sha1(self.paths.data.tobytes())
+        digest.update(self.paths.offsets.tobytes())
+        digest.update(stats.tobytes())
+        return digest.hexdigest()
+
+    def __getitem__(self, index: int) -> tuple:
+        return self.get_path(index), int(self.targets[index])
+
+    def __len__(self):
+        return len(self.targets)
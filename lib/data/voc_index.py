@@ -0,0 +1,201 @@
+import os
+import xml.etree.ElementTree as Et
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .index_files import load_index, save_index, load_json, save_json
+from .scanner import StringTable, scan_files, decode_paths
+from ..helpers import enums
+
+
+def _parse_annotation(annotation_file: str):
+    root = Et.parse(annotation_file).getroot()
+
+    size = root.find('size')
+    height = int(float(size.find('height').text)) if size is not None else 0
+    width = int(float(size.find('width').text)) if size is not None else 0
+
+    boxes = []
+    names = []
+
+    for obj in root.findall('object'):
+        bbox = obj.find('bndbox')
+        boxes.append([float(bbox.find('xmin').text), float(bbox.find('ymin').text),
+                      float(bbox.find('xmax').text), float(bbox.find('ymax').text)])
+        names.append(obj.find('name').text)
+
+    return boxes, names, height, width
+
+
+def _scan_split(root: str):
+    """Return the sorted image ids of a split and the mtimes of their annotation files"""
+    files = scan_files(root, extensions=(".jpg", ".xml"), stat_extensions=(".xml",))
+    image_ids = files[".jpg"]
+    xml_mtimes = files[".xml"]
+    mtimes = np.asarray([xml_mtimes.get(image_id, -1) for image_id in image_ids], dtype=np.int64)
+    return StringTable.from_list(image_ids), mtimes
+
+
+def _reuse_annotations(previous: dict, ids: StringTable, mtimes: np.ndarray) -> list:
+    """Annotations of a previous index for all ids whose annotation file is unchanged, else None"""
+    rows = {image_id: row for row, image_id in
+            enumerate(decode_paths(previous["id_data"], previous["id_offsets"]))}
+    offsets = previous["offsets"].tolist()
+    annotations = []
+    for image_id, mtime in zip(ids.tolist(), mtimes.tolist()):
+        row = rows.get(image_id)
+        if row is None or mtime < 0 or previous["mtimes"][row] != mtime:
+            annotations.append(None)
+            continue
+        start, end = offsets[row], offsets[row + 1]
+        names = previous["label_names"][previous["name_ids"][start:end]]
+        annotations.append((previous["boxes"][start:end].tolist(), names.tolist(),
+                            int(previous["heights"][row]), int(previous["widths"][row])))
+    return annotations
+
+
+def load_vocabulary(path: str) -> list:
+    """Class names of a dataset, the class at position i has the label id i + 1"""
+    return load_json(path) or []
+
+
+def save_vocabulary(path: str, classes: list):
+    save_json(path, classes)
+
+
+class VocAnnotationIndex:
+    """Columnar index of all VOC annotations of one split
+
+    Boxes store the position of their name in `label_names`, the names of the split, which are
+    mapped to the label ids of the dataset vocabulary by `set_vocabulary`
+    """
+
+    __ARRAYS = ("heights", "widths", "boxes", "name_ids", "offsets", "label_names")
+
+    def __init__(self, ids: StringTable, mtimes: np.ndarray, heights: np.ndarray,
+                 widths: np.ndarray, boxes: np.ndarray, name_ids: np.ndarray, offsets: np.ndarray,
+                 label_names: np.ndarray):
+        self.ids: StringTable = ids
+        self.mtimes: np.ndarray = mtimes
+        self.heights: np.ndarray = heights
+        self.widths: np.ndarray = widths
+        self.boxes: np.ndarray = boxes
+        self.name_ids: np.ndarray = name_ids
+        self.offsets: np.ndarray = offsets
+        self.label_names: np.ndarray = label_names
+        self.classes: list = []
+        self.labels: np.ndarray = None
+        self.label_offsets: np.ndarray = None
+        self.label_boxes: np.ndarray = None
+
+    @staticmethod
+    def get_index_path(root: str):
+        return f"{root.rstrip(os.sep)}{enums.CacheFileNames.VOC_INDEX.value}"
+
+    @staticmethod
+    def get_vocabulary_path(root: str):
+        """The vocabulary is shared by all splits, so it is stored in the parent directory"""
+        return os.path.join(os.path.dirname(root.rstrip(os.sep)),
+                            enums.CacheFileNames.VOC_LABELS.value)
+
+    @classmethod
+    def load_or_build(cls, root: str, vocabulary_path: str = None, update_vocabulary: bool = True,
+                      workers: int = None):
+        """Load the persisted index of a split, rebuild it if any annotation file changed
+
+        Only added and changed annotation files are parsed again, the others are reused. Names
+        not in the vocabulary are added to it if `update_vocabulary` is set, e.g. for the train
+        split, otherwise their boxes are dropped
+        """
+        index_path = cls.get_index_path(root)
+        vocabulary_path = vocabulary_path or cls.get_vocabulary_path(root)
+        ids, mtimes = _scan_split(root)
+
+        def is_complete(index: dict) -> bool:
+            return set(cls.__ARRAYS + ("id_data", "id_offsets", "mtimes")).issubset(index)
+
+        index = load_index(index_path, is_complete)
+        if index is not None and np.array_equal(index["id_data"], ids.data) and \
+                np.array_equal(index["id_offsets"], ids.offsets) and \
+                np.array_equal(index["mtimes"], mtimes):
+            voc_index = cls(ids=ids, mtimes=mtimes, **{name: index[name] for name in cls.__ARRAYS})
+        else:
+            voc_index = cls.build(root, ids, mtimes, workers, previous=index)
+            voc_index.save(index_path)
+
+        # Known classes keep their ids, new classes are appended in sorted order
+        classes = load_vocabulary(vocabulary_path)
+        if update_vocabulary or not classes:
+            new_classes = sorted(set(voc_index.label_names.tolist()) - set(classes))
+            if new_classes:
+                classes = classes + new_classes
+                save_vocabulary(vocabulary_path, classes)
+        voc_index.set_vocabulary(classes)
+        return voc_index
+
+    @classmethod
+    def build(cls, root: str, ids: StringTable, mtimes: np.ndarray, workers: int = None,
+              previous: dict = None):
+        """Parse the annotation files of a split in parallel
+
+        Annotations of unchanged files are taken from the `previous` index arrays if given
+        """
+        image_ids = ids.tolist()
+        annotations = _reuse_annotations(previous, ids, mtimes) if previous is not None \
+            else [None] * len(image_ids)
+        missing = [position for position, ann in enumerate(annotations) if ann is None]
+        if missing:
+            annotation_files = [os.path.join(root, f"{image_ids[position]}.xml")
+                                for position in missing]
+            workers = workers or os.cpu_count() or 1
+            chunk_size = max(1, len(annotation_files) // (workers * 4))
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                parsed = executor.map(_parse_annotation, annotation_files, chunksize=chunk_size)
+                for position, ann in zip(missing, parsed):
+                    annotations[position] = ann
+
+        label_names = sorted({name for ann in annotations for name in ann[1]})
+        name_to_position = {name: position for position, name in enumerate(label_names)}
+
+        offsets = np.zeros(len(annotations) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(ann[1]) for ann in annotations])
+        boxes = np.asarray([box for ann in annotations for box in ann[0]],
+                           dtype=np.float32).reshape(-1, 4)
+        name_ids = np.asarray([name_to_position[name] for ann in annotations for name in ann[1]],
+                              dtype=np.int64)
+
+        return cls(ids=ids, mtimes=mtimes,
+                   heights=np.asarray([ann[2] for ann in annotations], dtype=np.int64),
+                   widths=np.asarray([ann[3] for ann in annotations], dtype=np.int64),
+                   boxes=boxes, name_ids=name_ids, offsets=offsets,
+                   label_names=np.asarray(label_names, dtype=np.str_))
+
+    def set_vocabulary(self, classes: list):
+        """Map the names of the split to the label ids 1..N of the vocabulary, 0 is background"""
+        class_to_id = {name: class_id for class_id, name in enumerate(classes, 1)}
+        lookup = np.asarray([class_to_id.get(name, 0) for name in self.label_names.tolist()],
+                            dtype=np.int64)
+        labels = lookup[self.name_ids] if len(lookup) else np.zeros(0, dtype=np.int64)
+
+        # Drop boxes of unknown classes and recompute the offsets of the remaining boxes
+        known = labels > 0
+        image_ids = np.repeat(np.arange(len(self.ids)), np.diff(self.offsets))
+        offsets = np.zeros(len(self.ids) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(image_ids[known], minlength=len(self.ids)))
+
+        self.classes = list(classes)
+        self.labels = labels[known]
+        self.label_boxes = self.boxes[known]
+        self.label_offsets = offsets
+
+    def save(self, index_path: str):
+        save_index(index_path, id_data=self.ids.data, id_offsets=self.ids.offsets,
+                   mtimes=self.mtimes, **{name: getattr(self, name) for name in self.__ARRAYS})
+
+    def get(self, index: int):
+        start, end = self.label_offsets[index], self.label_offsets[index + 1]
+        return self.label_boxes[start:end], self.labels[start:end]
+
+    def __len__(self):
+        return len(self.ids)
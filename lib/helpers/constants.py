@@ -1,19 +1,16 @@
-from torchvision.transforms import AutoAugmentPolicy
-from torchvision import models
-
 # General
 NONE_VALUES = ["none", "undefined", "null"]
 
 # Hyp config
-OPTIMIZERS = ["adadelta", "adagrad", "adamw", "sparseadam", "adamax", "asgd",
+OPTIMIZERS = ["adadelta", "adagrad", "adam", "adamw", "sparseadam", "adamax", "asgd",
               "lbfgs", "nadam", "radam", "rmsprop", "rprop", "sgd"]
 SCHEDULER_TYPES = ["lambdalr", "multiplicativelr", "steplr", "multisteplr", "constantlr",
                    "linearlr", "exponentiallr", "polynomiallr", "cosineannealinglr",
                    "chainedscheduler", "sequentiallr", "reducelronplateau", "cycliclr",
                    "onecyclelr", "cosineannealingwarmrestarts"]
 WARMUP_METHODS = ["linear", "constant"]
-AUTO_AUG_POLICIES = ["randomaugment", "trivialaugmentwide", "augmix"] + \
-                    [p.value for p in AutoAugmentPolicy]
+# Custom policies followed by the values of torchvision's AutoAugmentPolicy
+AUTO_AUG_POLICIES = ["randomaugment", "trivialaugmentwide", "augmix", "imagenet", "cifar10", "svhn"]
 INTERPOLATION_MODES = ["nearest", "linear", "bilinear", "bicubic", "trilinear",
                        "area", "nearest-exact"]
 
@@ -26,7 +23,6 @@ CV2_INTERPOLATION_MODES = {
 
 # Args
 METHODS = ["classification", "detection", "segmentation"]
-TORCH_MODELS = ["custom"] + models.list_models()
 DATASET_TYPES = {
     "classification": ["imagefolder", "custom"],
     "detection": ["coco", "voc", "custom"],
@@ -1,16 +1,14 @@
 from functools import wraps
-from time import time
+from time import perf_counter_ns
 
 
 def stop_time(function):
+    """Return the result of the function together with its execution time in seconds"""
     @wraps(function)
     def timer_wrapper(*args, **kwargs):
-        start_time = time()
+        start_time = perf_counter_ns()
         result = function(*args, **kwargs)
-        end_time = time()
-        execution_time = end_time - start_time
-        if result:
-            return result, execution_time
-        return execution_time
+        execution_time = (perf_counter_ns() - start_time) / 1e9
+        return result, execution_time
 
     return timer_wrapper
@@ -5,6 +5,7 @@ class LogDirNames(Enum):
     OUTPUT_ROOT = "Output"
     TRAINING_ROOT = "Train_"
     CHECKPOINTS = "Checkpoints"
+    TENSORBOARD = "Tensorboard"
     EVAL = "Evaluation"
     EVAL_ROOT = "Eval_"
 
@@ -12,9 +13,23 @@ class LogDirNames(Enum):
 class LogFileNames(Enum):
     TRAIN_LOG = "TRAIN_LOG.txt"
     EVAL_LOG = "EVAL_LOG.txt"
+    CHECKPOINT_DATA = ".data"
 
 
 class CacheDirNames(Enum):
     ROOT = ".simple-torch-training"
     DATASETS = "datasets"
     MODELS = "models"
+    INDEXES = "indexes"
+
+
+class CacheFileNames(Enum):
+    SHARD_DATA = "shard.bin"
+    SHARD_INDEX = "shard_index.npz"
+    VOC_INDEX = ".voc_index.npz"
+    VOC_LABELS = ".voc_labels.json"
+    COCO_INDEX = ".coco_index.npz"
+    EVAL_IMAGES = "eval_images.u8"
+    EVAL_LABELS = "eval_labels.i64"
+    EVAL_FILLED = "eval_filled.u8"
+    LOADER_TUNING = "loader_tuning.json"
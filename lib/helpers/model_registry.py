@@ -0,0 +1,76 @@
+"""Lazily resolved model lists, cached on disk so startup needs neither imports nor network
+
+torchvision and torch are only imported when a list is not cached yet
+"""
+import functools
+import hashlib
+import json
+import os
+import time
+from importlib import metadata
+
+from lib.helpers import enums
+
+# Cached model lists older than this are resolved again
+CACHE_TTL_SECONDS = 7 * 24 * 60 * 60
+
+
+def _get_cache_path(name: str) -> str:
+    return os.path.expanduser(os.path.join("~", enums.CacheDirNames.ROOT.value,
+                                           enums.CacheDirNames.MODELS.value, f"{name}.json"))
+
+
+def _load_cached(name: str, ignore_ttl: bool = False):
+    cache_path = _get_cache_path(name)
+    try:
+        if not ignore_ttl and time.time() - os.path.getmtime(cache_path) > CACHE_TTL_SECONDS:
+            return None
+        with open(cache_path, encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def _save_cached(name: str, model_names: list):
+    cache_path = _get_cache_path(name)
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        temp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(model_names, file)
+        os.replace(temp_path, cache_path)
+    except OSError:
+        # A read-only home directory only costs the cache
+        pass
+
+
+@functools.lru_cache(maxsize=None)
+def get_torchvision_models() -> tuple:
+    """All torchvision model names, "custom" included"""
+    # The list only changes with the installed torchvision version
+    name = f"torchvision_{metadata.version('torchvision')}"
+    model_names = _load_cached(name, ignore_ttl=True)
+    if model_names is None:
+        from torchvision import models
+        model_names = models.list_models()
+        _save_cached(name, model_names)
+    return tuple(["custom"] + model_names)
+
+
+@functools.lru_cache(maxsize=None)
+def get_hub_models(repo: str):
+    """Entrypoints of a torch hub repo, None if they cannot be resolved, e.g. when offline"""
+    name = f"hub_{hashlib.sha1(repo.encode()).hexdigest()[:16]}"
+    model_names = _load_cached(name)
+    if model_names is not None:
+        return tuple(model_names)
+
+    import torch
+    try:
+        model_names = torch.hub.list(repo)
+    except (OSError, RuntimeError, ValueError):
+        # Fall back to an expired listing rather than failing without network
+        model_names = _load_cached(name, ignore_ttl=True)
+        return None if model_names is None else tuple(model_names)
+    _save_cached(name, model_names)
+    return tuple(model_names)
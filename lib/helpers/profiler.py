@@ -0,0 +1,126 @@
+import math
+from contextlib import contextmanager, nullcontext
+from time import perf_counter_ns
+
+# Histogram buckets per doubling of the duration
+_BUCKETS_PER_OCTAVE = 4
+_NUM_BUCKETS = 48 * _BUCKETS_PER_OCTAVE
+
+# Top level phases used to decide whether a run is input-bound or compute-bound
+INPUT_PHASES = ("data", "h2d")
+COMPUTE_PHASES = ("forward", "backward", "optimizer")
+
+
+class PhaseStats:
+    """Count, total and log scale histogram of the durations of one phase"""
+
+    def __init__(self):
+        """Constructor for PhaseStats"""
+
+        self.count: int = 0
+        self.total_ns: int = 0
+        self.max_ns: int = 0
+        self.histogram: list = [0] * _NUM_BUCKETS
+
+    def add(self, duration_ns: int):
+        self.count += 1
+        self.total_ns += duration_ns
+        self.max_ns = max(self.max_ns, duration_ns)
+        bucket = int(math.log2(duration_ns) * _BUCKETS_PER_OCTAVE) if duration_ns > 1 else 0
+        self.histogram[min(bucket, _NUM_BUCKETS - 1)] += 1
+
+    def percentile(self, fraction: float) -> float:
+        """Upper bound of the bucket containing the percentile in nanoseconds"""
+        threshold = fraction * self.count
+        seen = 0
+        for bucket, count in enumerate(self.histogram):
+            seen += count
+            if count and seen >= threshold:
+                return min(2 ** ((bucket + 1) / _BUCKETS_PER_OCTAVE), self.max_ns)
+        return float(self.max_ns)
+
+
+class Profiler:
+    """Nestable named phase timers, a shared no-op context when disabled"""
+
+    __NULL_CONTEXT = nullcontext()
+
+    def __init__(self, enabled: bool = False, synchronize=None):
+        """Constructor for Profiler"""
+
+        self.enabled: bool = enabled
+        # Called before reading the clock, so asynchronous device work is attributed correctly
+        self.synchronize = synchronize
+        self.phases: dict = {}
+        self.__stack: list = []
+        self.__start_ns: int = perf_counter_ns()
+
+    def reset(self):
+        self.phases = {}
+        self.__start_ns = perf_counter_ns()
+
+    def __record(self, name: str, duration_ns: int):
+        path = "/".join(self.__stack + [name])
+        stats = self.phases.get(path)
+        if stats is None:
+            stats = self.phases[path] = PhaseStats()
+        stats.add(duration_ns)
+
+    def __now(self) -> int:
+        if self.synchronize is not None:
+            self.synchronize()
+        return perf_counter_ns()
+
+    def phase(self, name: str):
+        """Context manager timing a phase, phases opened inside are nested below it"""
+        if not self.enabled:
+            return self.__NULL_CONTEXT
+        return self.__timed_phase(name)
+
+    @contextmanager
+    def __timed_phase(self, name: str):
+        start = self.__now()
+        self.__stack.append(name)
+        try:
+            yield
+        finally:
+            self.__stack.pop()
+            self.__record(name, self.__now() - start)
+
+    def iterate(self, iterable, name: str = "data"):
+        """Iterate and time the wait for every item as a phase"""
+        if not self.enabled:
+            yield from iterable
+            return
+        iterator = iter(iterable)
+        while True:
+            start = perf_counter_ns()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            self.__record(name, perf_counter_ns() - start)
+            yield item
+
+    def get_table(self) -> list:
+        """Breakdown of all phases since the last reset, one line per phase"""
+        wall_ns = max(perf_counter_ns() - self.__start_ns, 1)
+        lines = [f"{'Phase':<28}{'Count':>9}{'Total s':>10}{'Share':>8}"
+                 f"{'Mean ms':>10}{'P50 ms':>10}{'P90 ms':>10}{'Max ms':>10}"]
+        for path, stats in sorted(self.phases.items()):
+            lines.append(f"{path:<28}{stats.count:>9}{stats.total_ns / 1e9:>10.2f}"
+                         f"{stats.total_ns / wall_ns * 100:>7.1f}%"
+                         f"{stats.total_ns / max(stats.count, 1) / 1e6:>10.3f}"
+                         f"{stats.percentile(0.5) / 1e6:>10.3f}"
+                         f"{stats.percentile(0.9) / 1e6:>10.3f}"
+                         f"{stats.max_ns / 1e6:>10.3f}")
+
+        input_ns = sum(stats.total_ns for path, stats in self.phases.items()
+                       if path in INPUT_PHASES)
+        compute_ns = sum(stats.total_ns for path, stats in self.phases.items()
+                         if path in COMPUTE_PHASES)
+        if input_ns or compute_ns:
+            bound = "input-bound" if input_ns > compute_ns else "compute-bound"
+            lines.append(f"Waiting for input {input_ns / wall_ns * 100:.1f}%, compute "
+                         f"{compute_ns / wall_ns * 100:.1f}% of {wall_ns / 1e9:.1f}s, {bound}")
+        return lines
@@ -0,0 +1,51 @@
+import torch
+from torch import nn
+
+from lib.config_loaders.hyp_config import HypConfig
+
+NORM_LAYERS = (nn.modules.batchnorm._BatchNorm, nn.LayerNorm, nn.GroupNorm,
+               nn.modules.instancenorm._InstanceNorm, nn.LocalResponseNorm)
+MOMENTUM_OPTIMIZERS = ["sgd", "rmsprop"]
+
+
+def _get_optimizer_class(name: str):
+    for attr in dir(torch.optim):
+        if attr.lower() == name:
+            return getattr(torch.optim, attr)
+    raise ValueError(f"Optimizer {name} is not available in torch.optim!")
+
+
+def get_parameter_groups(model: nn.Module, hyp_config: HypConfig) -> list:
+    """Split the trainable parameters by the weight decay they should get"""
+    groups = {"default": [], "norm": [], "bias": [], "embedding": []}
+    decays = {
+        "default": hyp_config.weight_decay,
+        "norm": hyp_config.norm_weight_decay,
+        "bias": hyp_config.bias_weight_decay,
+        "embedding": hyp_config.embedding_decay
+    }
+
+    for module in model.modules():
+        for name, param in module.named_parameters(recurse=False):
+            if not param.requires_grad:
+                continue
+            if isinstance(module, NORM_LAYERS) and decays["norm"] is not None:
+                groups["norm"].append(param)
+            elif name == "bias" and decays["bias"] is not None:
+                groups["bias"].append(param)
+            elif "embedding" in name and decays["embedding"] is not None:
+                groups["embedding"].append(param)
+            else:
+                groups["default"].append(param)
+
+    return [{"params": params, "weight_decay": decays[key] or 0.0}
+            for key, params in groups.items() if params]
+
+
+def create_optimizer(model: nn.Module, hyp_config: HypConfig):
+    """Create the optimizer configured in the hyperparameter config"""
+    optimizer_class = _get_optimizer_class(hyp_config.optimizer)
+    kwargs = {"lr": hyp_config.learning_rate}
+    if hyp_config.optimizer in MOMENTUM_OPTIMIZERS and hyp_config.momentum is not None:
+        kwargs["momentum"] = hyp_config.momentum
+    return optimizer_class(get_parameter_groups(model, hyp_config), **kwargs)
@@ -0,0 +1,38 @@
+from torch.optim import lr_scheduler
+
+from lib.config_loaders.hyp_config import HypConfig
+
+
+def _create_main_scheduler(optimizer, hyp_config: HypConfig, epochs: int):
+    if hyp_config.scheduler_type == "steplr":
+        return lr_scheduler.StepLR(optimizer, step_size=hyp_config.scheduler_step_size,
+                                   gamma=hyp_config.scheduler_gamma)
+    if hyp_config.scheduler_type == "exponentiallr":
+        return lr_scheduler.ExponentialLR(optimizer, gamma=hyp_config.scheduler_gamma)
+    if hyp_config.scheduler_type == "cosineannealinglr":
+        return lr_scheduler.CosineAnnealingLR(optimizer, T_max=max(epochs, 1),
+                                              eta_min=hyp_config.min_lr or 0.0)
+    if hyp_config.scheduler_type == "constantlr":
+        return lr_scheduler.ConstantLR(optimizer, factor=1.0)
+    raise ValueError(f"Scheduler type {hyp_config.scheduler_type} cannot be created from the "
+                     "hyperparameter config, use one of: steplr, exponentiallr, "
+                     "cosineannealinglr, constantlr")
+
+
+def create_scheduler(optimizer, hyp_config: HypConfig, epochs: int):
+    """Create the per epoch LR scheduler configured in the hyperparameter config"""
+    warmup_epochs = hyp_config.warmup_epochs or 0
+    main_scheduler = _create_main_scheduler(optimizer, hyp_config, epochs - warmup_epochs)
+    if warmup_epochs == 0:
+        return main_scheduler
+
+    if hyp_config.warmup_method == "linear":
+        warmup_scheduler = lr_scheduler.LinearLR(optimizer,
+                                                 start_factor=hyp_config.warmup_decay,
+                                                 total_iters=warmup_epochs)
+    else:
+        warmup_scheduler = lr_scheduler.ConstantLR(optimizer,
+                                                   factor=hyp_config.warmup_decay,
+                                                   total_iters=warmup_epochs)
+    return lr_scheduler.SequentialLR(optimizer, schedulers=[warmup_scheduler, main_scheduler],
+                                     milestones=[warmup_epochs])
@@ -7,6 +7,9 @@ class Processes(Enum):
     CONF_PARSING_HYP = "Hyperparameter config parsing"
     CONF_PARSING_DATA = "Data config parsing"
     DATA_LOADING = "Dataset loading"
+    MODEL_LOADING = "Model loading"
+    OPTIMIZER_CREATION = "Optimizer creation"
+    CHECKPOINT_SAVING = "Checkpoint saving"
 
 
 class Prefixes(Enum):
@@ -0,0 +1,60 @@
+import atexit
+import queue
+import threading
+import time
+
+
+class LogWriter:
+    """Appends log lines to a file from a background thread, batching writes"""
+
+    def __init__(self, path: str, flush_interval: float = 1.0, max_lines: int = 256):
+        """Constructor for LogWriter"""
+
+        self.path: str = path
+        self.flush_interval: float = flush_interval
+        self.max_lines: int = max_lines
+
+        self.__queue: queue.Queue = queue.Queue()
+        self.__closed: bool = False
+        self.__thread = threading.Thread(target=self.__run, name="log-writer", daemon=True)
+        self.__thread.start()
+        # Drain remaining lines on interpreter exit, including sys.exit and uncaught errors
+        atexit.register(self.close)
+
+    def write(self, line: str):
+        if self.__closed:
+            return
+        self.__queue.put(line)
+
+    def __run(self):
+        with open(self.path, mode="a", encoding="utf-8") as log_file:
+            lines = []
+            last_flush = time.monotonic()
+            running = True
+            while running:
+                timeout = max(self.flush_interval - (time.monotonic() - last_flush), 0)
+                try:
+                    line = self.__queue.get(timeout=timeout)
+                    if line is None:
+                        running = False
+                    else:
+                        lines.append(line)
+                except queue.Empty:
+                    pass
+
+                if not running or len(lines) >= self.max_lines or \
+                        time.monotonic() - last_flush >= self.flush_interval:
+                    if lines:
+                        log_file.write("\n".join(lines) + "\n")
+                        log_file.flush()
+                        lines = []
+                    last_flush = time.monotonic()
+
+    def close(self):
+        """Write all queued lines and stop the writer thread"""
+        if self.__closed:
+            return
+        self.__closed = True
+        self.__queue.put(None)
+        self.__thread.join()
+        atexit.unregister(self.close)
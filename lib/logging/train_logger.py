@@ -4,6 +4,7 @@ from datetime import datetime
 
 from lib.args.args_loader import ArgsLoader
 from lib.logging import log_messages
+from lib.logging.log_writer import LogWriter
 from lib.helpers import enums
 from lib.config_loaders.logging_config import LoggingConfig
 from lib.config_loaders.hyp_config import HypConfig
@@ -13,16 +14,21 @@ from lib.config_loaders.data_config import DataConfig
 class TrainLogger:
     """Logger for training"""
 
-    def __init__(self):
+    def __init__(self, is_main_process: bool = True):
         """Constructor for TrainLogger"""
 
-        self.__print_welcome_message()
-        self.__log_file_created: bool = False
+        # Only the main process logs and writes files, other ranks only report errors
+        self.is_main_process: bool = is_main_process
+        if self.is_main_process:
+            self.__print_welcome_message()
+        self.__log_writer: LogWriter = None
+        self.__tb_writer = None
 
         self.__logging_config = None
 
         self.__output_root_dir: str = ""
         self.__train_root_dir: str = ""
+        self.checkpoint_dir: str = ""
 
     def load_config(self, custom: bool):
         try:
@@ -33,28 +39,35 @@ class TrainLogger:
                 exception_name=type(exc).__name__,
                 message=exc.args[0])
 
-    def __log(self, message: str):
-        print(message)
-        if self.__logging_config is None:
+    def __log(self, message: str, force: bool = False, console: bool = True):
+        if not (self.is_main_process or force):
             return
-        if self.__logging_config.write_to_file and self.__log_file_created:
-            with open(self.__log_file, mode="a", encoding="utf-8") as log_file:
-                log_file.write(message + "\n")
-            log_file.close()
+        if console:
+            print(message)
+        if self.__log_writer is not None:
+            self.__log_writer.write(message)
+
+    def close(self):
+        """Write all buffered lines to the log file and close the TensorBoard writer"""
+        if self.__log_writer is not None:
+            self.__log_writer.close()
+        if self.__tb_writer is not None:
+            self.__tb_writer.close()
 
     def log_error(self, process: log_messages.Processes, exception_name: str, message: str,
                   exit_process: bool = True):
         self.__log(
-            f"{log_messages.Prefixes.ERROR.value}    Something went wrong during {process.value}!")
+            f"{log_messages.Prefixes.ERROR.value}    Something went wrong during {process.value}!",
+            force=True)
         self.__log(
-            f"{log_messages.Prefixes.ERROR.value}    ➡  {exception_name}: {message}")
+            f"{log_messages.Prefixes.ERROR.value}    ➡  {exception_name}: {message}", force=True)
         if exit_process:
             sys.exit(1)
 
     def log_warning(self, message: str):
         self.__log(f"{log_messages.Prefixes.WARNING.value}    {message}")
 
-    def log_info(self, message: str, show_date_time: bool = False):
+    def log_info(self, message: str, show_date_time: bool = False, console: bool = True):
         info_str = log_messages.Prefixes.INFO.value
         if show_date_time:
             info_str += f"[{datetime.now()}]    "
@@ -62,7 +75,7 @@ class TrainLogger:
             info_str += "    "
 
         info_str += message
-        self.__log(info_str)
+        self.__log(info_str, console=console)
 
     def log_success(self, message: str, show_date_time: bool = False):
         info_str = log_messages.Prefixes.SUCCESS.value
@@ -104,10 +117,76 @@ class TrainLogger:
                 self.__log(f"{log_messages.Prefixes.CONFIG.value}        ▫ {attr}: {value}")
         self.__log("\n")
 
+    @property
+    def config(self) -> LoggingConfig:
+        return self.__logging_config
+
+    @property
+    def writes_to_file(self) -> bool:
+        return self.__log_writer is not None
+
+    def log_train_start(self, start_epoch: int, epochs: int):
+        self.log_info(f"Start training from epoch {start_epoch} to {epochs}...",
+                      show_date_time=True)
+
+    def is_print_batch(self, batch_index: int, num_batches: int) -> bool:
+        """Whether training metrics are reduced and logged after this batch"""
+        print_freq = self.__logging_config.print_freq_train
+        return batch_index == num_batches or bool(print_freq and not batch_index % print_freq)
+
+    def log_batch_loss(self, epoch: int, batch_index: int, num_batches: int, loss: float):
+        """Loss of a batch between two print boundaries, only written to the log file"""
+        self.log_info(f"Epoch {epoch} [{batch_index}/{num_batches}]    loss: {loss:.4f}",
+                      console=False)
+
+    def __add_scalars(self, tag: str, step: int, **scalars):
+        if self.__tb_writer is None:
+            return
+        for name, value in scalars.items():
+            if value is not None:
+                self.__tb_writer.add_scalar(f"{tag}/{name}", value, step)
+
+    def log_batch(self, epoch: int, batch_index: int, num_batches: int, global_step: int,
+                  loss: float, samples_per_sec: float, accuracy: float = None):
+        message = f"Epoch {epoch} [{batch_index}/{num_batches}]    loss: {loss:.4f}"
+        if accuracy is not None:
+            message += f"    accuracy: {accuracy * 100:.2f}%"
+        self.log_info(message + f"    {samples_per_sec:.1f} samples/s")
+        if self.__logging_config.tb_log_type_train == "batch":
+            self.__add_scalars("Train", global_step, loss=loss, accuracy=accuracy,
+                               samples_per_sec=samples_per_sec)
+
+    def log_epoch_end(self, epoch: int, loss: float, duration: float, samples_per_sec: float,
+                      accuracy: float = None):
+        message = f"Epoch {epoch} finished in {duration:.1f}s    loss: {loss:.4f}    "
+        if accuracy is not None:
+            message += f"accuracy: {accuracy * 100:.2f}%    "
+        self.log_success(message + f"{samples_per_sec:.1f} samples/s", show_date_time=True)
+        if self.__logging_config.tb_log_type_train == "epoch":
+            self.__add_scalars("Train", epoch, loss=loss, accuracy=accuracy,
+                               samples_per_sec=samples_per_sec)
+
+    def log_eval(self, epoch: int, loss: float, accuracy: float = None, name: str = "Model"):
+        message = f"Evaluation of epoch {epoch}    {name} loss: {loss:.4f}"
+        if accuracy is not None:
+            message += f"    {name} accuracy: {accuracy * 100:.2f}%"
+        self.log_info(message, show_date_time=True)
+        # Evaluation metrics are only reduced once per epoch
+        self.__add_scalars(f"Eval_{name}", epoch, loss=loss, accuracy=accuracy)
+
+    def log_profile(self, epoch: int, table: list):
+        self.log_info(f"Step phase breakdown of epoch {epoch}:")
+        for line in table:
+            self.log_info(f"    {line}")
+
     def init_logging(self, args_loader: ArgsLoader, hyp_config: HypConfig, data_config: DataConfig):
+        if not self.is_main_process:
+            return
         self.__init_output_dir(args_loader.output_dir)
         self.__init_new_train_dir()
+        self.__init_checkpoint_dir()
         self.__init_log_file()
+        self.__init_tensorboard()
 
         if self.__logging_config.log_args:
             self.__log_config("Loaded arguments:")
@@ -125,13 +204,13 @@ class TrainLogger:
             os.mkdir(out_dir)
             self.log_files(f"Created directory: {out_dir}")
 
-        self.__output_root_dir = os.path.join(out_dir, dir_names.LogDirNames.OUTPUT_ROOT.value)
+        self.__output_root_dir = os.path.join(out_dir, enums.LogDirNames.OUTPUT_ROOT.value)
         if not os.path.exists(self.__output_root_dir):
             os.mkdir(self.__output_root_dir)
             self.log_files(f"Created directory: {self.__output_root_dir}")
 
     def __init_new_train_dir(self):
-        train_dir = os.path.join(self.__output_root_dir, dir_names.LogDirNames.TRAINING_ROOT.value)
+        train_dir = os.path.join(self.__output_root_dir, enums.LogDirNames.TRAINING_ROOT.value)
         train_try = 1
         while os.path.exists(f"{train_dir}{train_try}"):
             train_try += 1
@@ -139,15 +218,34 @@ class TrainLogger:
         os.mkdir(self.__train_root_dir)
         self.log_files(f"Outputs will be saved to: {self.__train_root_dir}")
 
+    def __init_checkpoint_dir(self):
+        self.checkpoint_dir = os.path.join(self.__train_root_dir,
+                                           enums.LogDirNames.CHECKPOINTS.value)
+        os.mkdir(self.checkpoint_dir)
+
     def __init_log_file(self):
         self.__log_file = os.path.join(self.__train_root_dir,
-                                       dir_names.LogFileNames.TRAIN_LOG.value)
+                                       enums.LogFileNames.TRAIN_LOG.value)
         if not os.path.isfile(self.__log_file):
             with open(self.__log_file, "w", encoding="utf-8") as file:
                 file.write(f"{log_messages.log_file_intro} - "
                            f"{datetime.now().strftime('%b %d %Y %H:%M:%S')}\n\n")
         self.log_files(f"Training log will be saved to: {self.__log_file}")
-        self.__log_file_created = True
+        if self.__logging_config.write_to_file:
+            self.__log_writer = LogWriter(self.__log_file)
+
+    def __init_tensorboard(self):
+        if not self.__logging_config.tb_logging:
+            return
+        try:
+            # TensorBoard is an optional dependency
+            from torch.utils.tensorboard import SummaryWriter
+        except ImportError:
+            self.log_warning("TensorBoard is not installed, disabling TensorBoard logging!")
+            return
+        tb_dir = os.path.join(self.__train_root_dir, enums.LogDirNames.TENSORBOARD.value)
+        self.__tb_writer = SummaryWriter(log_dir=tb_dir)
+        self.log_files(f"TensorBoard logs will be saved to: {tb_dir}")
 
     @staticmethod
     def __print_welcome_message():
@@ -0,0 +1,295 @@
+import math
+import mmap
+import os
+import random
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import torch
+
+from lib.helpers import enums
+
+# Tensor data is aligned, so every tensor can be viewed directly from the memory map
+_ALIGNMENT = 64
+
+
+class _TensorRef:
+    """Location of a tensor in the checkpoint data file"""
+
+    __slots__ = ("offset", "dtype", "shape")
+
+    def __init__(self, offset: int, dtype: torch.dtype, shape: tuple):
+        self.offset: int = offset
+        self.dtype: torch.dtype = dtype
+        self.shape: tuple = shape
+
+
+def get_data_path(path: str) -> str:
+    return path + enums.LogFileNames.CHECKPOINT_DATA.value
+
+
+def _to_cpu(obj):
+    """Copy all tensors of a (nested) state dict to CPU memory"""
+    if isinstance(obj, torch.Tensor):
+        return obj.detach().to("cpu", copy=True)
+    if isinstance(obj, dict):
+        return {key: _to_cpu(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_to_cpu(value) for value in obj)
+    return obj
+
+
+def get_rng_state() -> dict:
+    state = {
+        "python": random.getstate(),
+        "numpy": np.random.get_state(),
+        "torch": torch.get_rng_state()
+    }
+    if torch.cuda.is_available():
+        state["cuda"] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def set_rng_state(state: dict):
+    random.setstate(state["python"])
+    np.random.set_state(state["numpy"])
+    torch.set_rng_state(state["torch"].clone())
+    if torch.cuda.is_available() and "cuda" in state:
+        torch.cuda.set_rng_state_all([cuda_state.clone() for cuda_state in state["cuda"]])
+
+
+def _write_tensors(obj, file):
+    """Write all tensors of a (nested) state dict to the file and replace them by references"""
+    if isinstance(obj, torch.Tensor):
+        file.write(bytes(-file.tell() % _ALIGNMENT))
+        ref = _TensorRef(file.tell(), obj.dtype, tuple(obj.shape))
+        if obj.numel():
+            file.write(obj.reshape(-1).view(torch.uint8).numpy().data)
+        return ref
+    if isinstance(obj, dict):
+        return {key: _write_tensors(value, file) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_write_tensors(value, file) for value in obj)
+    return obj
+
+
+class LazyCheckpoint:
+    """Checkpoint opened with mmap, tensors are materialised as views only when accessed"""
+
+    def __init__(self, path: str):
+        """Constructor for LazyCheckpoint"""
+
+        index = torch.load(path)
+        self.__state: dict = index["state"]
+        data_path = os.path.join(os.path.dirname(path), index["data_file"])
+        self.__buffer = None
+        if os.path.getsize(data_path):
+            with open(data_path, "rb") as file:
+                # Copy on write, so the tensor views are writable without touching the file
+                self.__buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_COPY)
+
+    @staticmethod
+    def exists(path: str) -> bool:
+        return os.path.isfile(get_data_path(path))
+
+    def __materialize(self, obj):
+        if isinstance(obj, _TensorRef):
+            numel = math.prod(obj.shape)
+            if numel == 0:
+                return torch.empty(obj.shape, dtype=obj.dtype)
+            return torch.frombuffer(self.__buffer, dtype=obj.dtype, count=numel,
+                                    offset=obj.offset).view(obj.shape)
+        if isinstance(obj, dict):
+            return {key: self.__materialize(value) for key, value in obj.items()}
+        if isinstance(obj, (list, tuple)):
+            return type(obj)(self.__materialize(value) for value in obj)
+        return obj
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.__state
+
+    def __getitem__(self, key: str):
+        return self.__materialize(self.__state[key])
+
+
+def open_checkpoint(path: str):
+    """Open a checkpoint lazily if it has a data file, checkpoints without are loaded fully"""
+    if LazyCheckpoint.exists(path):
+        return LazyCheckpoint(path)
+    return torch.load(path, map_location="cpu")
+
+
+def load_optimizer_state(optimizer, state_dict: dict):
+    """Load the optimizer state by copying every tensor directly to its parameter's device
+
+    Optimizer.load_state_dict deep copies the whole state first, doubling the peak memory
+    """
+    params = [param for group in optimizer.param_groups for param in group["params"]]
+    optimizer.load_state_dict({"state": {}, "param_groups": state_dict["param_groups"]})
+    for index, param_state in state_dict["state"].items():
+        param = params[index]
+        state = {}
+        for key, value in param_state.items():
+            if not isinstance(value, torch.Tensor):
+                state[key] = value
+            elif key == "step":
+                state[key] = value.clone()
+            elif value.is_floating_point():
+                state[key] = value.to(param.device, dtype=param.dtype, copy=True)
+            else:
+                state[key] = value.to(param.device, copy=True)
+        optimizer.state[param] = state
+
+
+class CheckpointManager:
+    """Writes checkpoints atomically on a background thread and applies the retention policy"""
+
+    def __init__(self, checkpoint_dir: str, save_type: str, keep_last_n: int = None,
+                 on_written=None):
+        """Constructor for CheckpointManager
+
+        on_written(path, exception) is called on the writer thread once a checkpoint is written,
+        the exception is None if the write succeeded
+        """
+
+        self.checkpoint_dir: str = checkpoint_dir
+        self.save_type: str = save_type
+        self.keep_last_n: int = keep_last_n
+        self.on_written = on_written
+        self.best_score: float = None
+
+        self.__saved_paths: list = []
+        self.__step_path: str = None
+        # Writes in flight, the one being written and at most one queued behind it
+        self.__pending: deque = deque()
+        # Best score of all queued checkpoints, committed to best_score once they are written
+        self.__queued_best: float = None
+        # A single thread keeps writes and deletions in order
+        self.__executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="checkpoint")
+
+    @staticmethod
+    def __get_score(metrics: dict):
+        if metrics is None:
+            return None
+        # Classification uses the accuracy, detection the validation loss
+        if metrics.get("accuracy") is not None:
+            return metrics["accuracy"]
+        return -metrics["loss"]
+
+    def __is_best(self, score) -> bool:
+        return score is None or self.__queued_best is None or score > self.__queued_best
+
+    def save(self, state: dict, epoch: int, metrics: dict = None, step: int = None) -> str:
+        """Snapshot the state to CPU memory and write it in the background
+
+        Only the device to host copy blocks, unless a checkpoint is still queued behind the one
+        being written. Returns the checkpoint path or None if the checkpoint is not kept.
+        Mid-epoch checkpoints are saved with their global step and only the latest one is kept
+        until the checkpoint of its epoch is written, independent of the retention policy
+        """
+        if self.save_type == "none":
+            return None
+        self.__collect(block=len(self.__pending) > 1)
+        score = self.__get_score(metrics) if step is None else None
+        if step is None and self.save_type == "best" and not self.__is_best(score):
+            # The finished epoch supersedes its mid-epoch checkpoint even if it is not kept
+            self.__pending.append(self.__executor.submit(self.__remove_step))
+            self.__pending[-1].checkpoint_path = self.__step_path
+            return None
+        if score is not None:
+            self.__queued_best = score
+
+        snapshot = _to_cpu(state)
+        file_name = f"epoch_{epoch}.pt" if step is None else f"epoch_{epoch}_step_{step}.pt"
+        path = os.path.join(self.checkpoint_dir, file_name)
+        future = self.__executor.submit(self.__run, snapshot, path, step is not None, score)
+        future.checkpoint_path = path
+        self.__pending.append(future)
+        return path
+
+    def __run(self, snapshot: dict, path: str, is_step: bool, score):
+        try:
+            self.__write(snapshot, path, is_step)
+        except Exception as exc:
+            # Later checkpoints are compared against the best one that was really written
+            self.__queued_best = self.best_score
+            if self.on_written is not None:
+                self.on_written(path, exc)
+            raise
+        # The score only counts once its checkpoint exists, a failed write never blocks others
+        if score is not None:
+            self.best_score = score
+        if self.on_written is not None:
+            self.on_written(path, None)
+
+    @staticmethod
+    def __write_atomic(path: str, write):
+        temp_path = path + ".tmp"
+        with open(temp_path, "wb") as file:
+            result = write(file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, path)
+        return result
+
+    def __write(self, snapshot: dict, path: str, is_step: bool):
+        # Tensor data goes to a separate file that can be memory mapped on resume, the index is
+        # written last, so an existing index always belongs to complete tensor data
+        data_path = get_data_path(path)
+        state = self.__write_atomic(data_path, lambda file: _write_tensors(snapshot, file))
+        index = {"data_file": os.path.basename(data_path), "state": state}
+        self.__write_atomic(path, lambda file: torch.save(index, file))
+
+        self.__remove_step()
+        if is_step:
+            self.__step_path = path
+            return
+        self.__saved_paths.append(path)
+        self.__apply_retention()
+
+    def __remove_step(self):
+        if self.__step_path is not None:
+            self.__remove(self.__step_path)
+            self.__step_path = None
+
+    @staticmethod
+    def __remove(path: str):
+        for file_path in (path, get_data_path(path)):
+            if os.path.isfile(file_path):
+                os.remove(file_path)
+
+    def __apply_retention(self):
+        if self.save_type == "best":
+            keep = 1
+        elif self.save_type == "lastn":
+            keep = self.keep_last_n
+        else:
+            return
+        while len(self.__saved_paths) > keep:
+            self.__remove(self.__saved_paths.pop(0))
+
+    def __collect(self, block: bool):
+        """Drop finished writes, reraising their errors with the checkpoint path
+
+        With `block` the oldest write is waited for, so at most one checkpoint stays queued
+        """
+        while self.__pending and (block or self.__pending[0].done()):
+            pending = self.__pending.popleft()
+            block = False
+            try:
+                pending.result()
+            except OSError as exc:
+                raise OSError(f"Could not write checkpoint {pending.checkpoint_path}: "
+                              f"{exc}") from exc
+
+    def wait(self):
+        """Block until all pending checkpoints are written, reraising write errors"""
+        while self.__pending:
+            self.__collect(block=True)
+
+    def close(self):
+        try:
+            self.wait()
+        finally:
+            self.__executor.shutdown(wait=True)
@@ -0,0 +1,58 @@
+import os
+import socket
+
+import torch
+from torch import distributed as dist
+
+from lib.config_loaders.hyp_config import HypConfig
+
+
+def get_world_size(args) -> int:
+    """Number of processes to spawn for the parsed args"""
+    if not args.distributed:
+        return 1
+    try:
+        world_size = HypConfig(args.custom_hyp_cfg).world_size
+    except (ValueError, TypeError):
+        # The Trainer reports config errors with proper logging
+        return 1
+    return max(world_size or 1, 1)
+
+
+def prepare_env(url: str = "env://"):
+    """Set a free local rendezvous address before spawning processes on a single host"""
+    if url != "env://":
+        return
+    os.environ.setdefault("MASTER_ADDR", "127.0.0.1")
+    if "MASTER_PORT" not in os.environ:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            sock.bind(("127.0.0.1", 0))
+            os.environ["MASTER_PORT"] = str(sock.getsockname()[1])
+
+
+def init_process_group(rank: int, world_size: int, url: str, cuda: bool) -> torch.device:
+    """Initialize the process group, nccl when CUDA is used and available, gloo otherwise"""
+    use_nccl = cuda and torch.cuda.is_available() and dist.is_nccl_available()
+    if use_nccl:
+        torch.cuda.set_device(rank % torch.cuda.device_count())
+
+    prepare_env(url)
+    dist.init_process_group(backend="nccl" if use_nccl else "gloo",
+                            init_method=url,
+                            world_size=world_size,
+                            rank=rank)
+
+    if cuda:
+        return torch.device("cuda", rank % torch.cuda.device_count())
+    # All ranks share the cores of this host, by default every rank would use all of them
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // world_size))
+    return torch.device("cpu")
+
+
+def is_main_process() -> bool:
+    return not dist.is_initialized() or dist.get_rank() == 0
+
+
+def cleanup():
+    if dist.is_initialized():
+        dist.destroy_process_group()
@@ -0,0 +1,77 @@
+import copy
+from contextlib import contextmanager
+
+import torch
+from torch import nn
+
+
+class ExponentialMovingAverage:
+    """Shadow copy of the model weights updated with fused multi-tensor operations"""
+
+    def __init__(self, model: nn.Module, decay: float, steps: int = 1, cpu_offload: bool = False):
+        """Constructor for ExponentialMovingAverage"""
+
+        self.decay: float = decay
+        self.steps: int = max(steps or 1, 1)
+        self.cpu_offload: bool = cpu_offload
+        self.num_updates: int = 0
+        self.__iteration: int = 0
+
+        self.module: nn.Module = copy.deepcopy(model).eval().requires_grad_(False)
+        if cpu_offload:
+            self.module.to("cpu")
+
+        # The source tensors are updated in place by the optimizer, so they can be cached
+        source = list(model.state_dict(keep_vars=True).values())
+        self.__source_float = [t for t in source if t.is_floating_point()]
+        self.__source_other = [t for t in source if not t.is_floating_point()]
+        self.__shadow_float: list = []
+        self.__shadow_other: list = []
+        self.__collect_shadow()
+
+    def __collect_shadow(self):
+        shadow = list(self.module.state_dict(keep_vars=True).values())
+        self.__shadow_float = [t for t in shadow if t.is_floating_point()]
+        self.__shadow_other = [t for t in shadow if not t.is_floating_point()]
+
+    def step(self):
+        """Count one training iteration and update the shadow weights every `steps` iterations"""
+        self.__iteration += 1
+        if self.__iteration % self.steps == 0:
+            self.update()
+
+    @torch.no_grad()
+    def update(self):
+        # Compensate for the iterations skipped between two updates
+        decay = self.decay ** self.steps
+        source_float = [t.detach() for t in self.__source_float]
+        if self.cpu_offload:
+            source_float = [t.to("cpu") for t in source_float]
+
+        torch._foreach_mul_(self.__shadow_float, decay)
+        torch._foreach_add_(self.__shadow_float, source_float, alpha=1 - decay)
+        for shadow, source in zip(self.__shadow_other, self.__source_other):
+            shadow.copy_(source)
+        self.num_updates += 1
+
+    @contextmanager
+    def on_device(self, device: torch.device):
+        """Temporarily move an offloaded EMA model to the device, e.g. for evaluation"""
+        if not self.cpu_offload:
+            yield self.module
+            return
+        self.module.to(device)
+        try:
+            yield self.module
+        finally:
+            self.module.to("cpu")
+            self.__collect_shadow()
+
+    def state_dict(self) -> dict:
+        return {"module": self.module.state_dict(), "num_updates": self.num_updates,
+                "iteration": self.__iteration}
+
+    def load_state_dict(self, state_dict: dict):
+        self.module.load_state_dict(state_dict["module"])
+        self.num_updates = state_dict["num_updates"]
+        self.__iteration = state_dict["iteration"]
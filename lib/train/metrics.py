@@ -0,0 +1,51 @@
+import torch
+from torch import distributed as dist
+
+
+class MetricTracker:
+    """Running metric sums kept on the device, only synchronised with the host when reduced"""
+
+    def __init__(self, device: torch.device, names: tuple):
+        """Constructor for MetricTracker"""
+
+        self.names: tuple = tuple(names)
+        self.__indices: dict = {name: index for index, name in enumerate(self.names)}
+        self.__sums: torch.Tensor = torch.zeros(len(self.names), dtype=torch.float64,
+                                                device=device)
+        self.__counts: list = [0] * len(self.names)
+        self.__totals: list = [0.] * len(self.names)
+        self.__total_counts: list = [0] * len(self.names)
+
+    def update(self, name: str, total: torch.Tensor, count: int):
+        """Add a sum over `count` samples without waiting for the device"""
+        index = self.__indices[name]
+        self.__sums[index] += total.detach()
+        self.__counts[index] += count
+
+    def reduce(self) -> tuple:
+        """Sync once, all-reduce across ranks and return the means since the last reduction
+
+        Returns the means per metric and the number of samples of the first metric
+        """
+        counts = torch.tensor(self.__counts, dtype=torch.float64, device=self.__sums.device)
+        values = torch.cat([self.__sums, counts])
+        if dist.is_initialized() and dist.get_world_size() > 1:
+            dist.all_reduce(values)
+        values = values.tolist()
+        self.__sums.zero_()
+        self.__counts = [0] * len(self.names)
+
+        num_names = len(self.names)
+        means = {}
+        for index, name in enumerate(self.names):
+            total, count = values[index], int(values[num_names + index])
+            self.__totals[index] += total
+            self.__total_counts[index] += count
+            means[name] = total / count if count else 0.
+        return means, int(values[num_names]) if num_names else 0
+
+    def get_totals(self) -> tuple:
+        """Means and number of samples of everything reduced so far"""
+        means = {name: total / count if count else 0.
+                 for name, total, count in zip(self.names, self.__totals, self.__total_counts)}
+        return means, self.__total_counts[0] if self.names else 0
@@ -1,27 +1,199 @@
-"""Module providingFunction printing python version."""
+"""Module running training and evaluation epochs"""
+import time
 
-def train_epoch():
-    model = trainer.get_model()
+import torch
+from torch import nn
 
-    trainer.train_logger.log_start()
-    for epoch in range(trainer.start_epoch, trainer.epochs + 1):
-        epoch_loss = 0.
+from lib.data.collate import DetectionBatch, unpack_images, unpack_targets
+from lib.logging.train_logger import TrainLogger
+from lib.helpers.profiler import Profiler
+from lib.train.metrics import MetricTracker
 
-        for batch_index, batch in enumerate(trainer.dataloader, 1):
-            inputs, labels = batch[0].to(trainer.device), batch[1].to(trainer.device)
+# Layers behaving differently in training mode, BatchNorm updates its running statistics
+_TRAIN_MODE_LAYERS = (nn.BatchNorm1d, nn.BatchNorm2d, nn.BatchNorm3d, nn.SyncBatchNorm,
+                      nn.Dropout, nn.Dropout2d, nn.Dropout3d, nn.AlphaDropout)
 
-            trainer.hyp_loader.optimizer.zero_grad()
 
+class EpochRunner:
+    """Runs training and evaluation epochs with optional mixed precision and channels_last"""
+
+    def __init__(self, model: nn.Module, criterion: nn.Module, optimizer, device: torch.device,
+                 logger: TrainLogger, is_detection: bool = False, amp: bool = False,
+                 channels_last: bool = False, clip_grad_norm: float = None):
+        """Constructor for EpochRunner"""
+
+        self.model: nn.Module = model
+        self.criterion: nn.Module = criterion
+        self.optimizer = optimizer
+        self.device: torch.device = device
+        self.logger: TrainLogger = logger
+        self.is_detection: bool = is_detection
+        self.amp: bool = amp
+        self.channels_last: bool = channels_last
+        self.clip_grad_norm: float = clip_grad_norm
+        self.global_step: int = 0
+        self.profiler: Profiler = Profiler(enabled=False)
+
+        # Loss scaling is only needed for float16 on CUDA, CPU autocast uses bfloat16
+        self.scaler = torch.cuda.amp.GradScaler() if amp and device.type == "cuda" else None
+
+    def __autocast(self):
+        dtype = torch.float16 if self.device.type == "cuda" else torch.bfloat16
+        return torch.autocast(device_type=self.device.type, dtype=dtype, enabled=self.amp)
+
+    def __prepare_images(self, images: torch.Tensor, batch_transforms) -> torch.Tensor:
+        images = images.to(self.device, non_blocking=True)
+        if batch_transforms is not None:
+            with self.profiler.phase("batch_transforms"):
+                images = batch_transforms(images)
+        if self.channels_last:
+            images = images.contiguous(memory_format=torch.channels_last)
+        return images
+
+    def __prepare_batch(self, batch, batch_transforms):
+        if isinstance(batch, DetectionBatch):
+            batch = batch.to(self.device, non_blocking=True)
+            batch.images = self.__prepare_images(batch.images, batch_transforms)
+            return unpack_images(batch), unpack_targets(batch), len(batch)
+
+        inputs, targets = batch
+        inputs = self.__prepare_images(inputs, batch_transforms)
+        targets = targets.to(self.device, non_blocking=True)
+        return inputs, targets, inputs.shape[0]
+
+    def __forward(self, model: nn.Module, inputs, targets):
+        """Return the loss and the number of correct predictions (None for detection)"""
+        with self.__autocast():
+            if isinstance(inputs, list):
+                loss_dict = model(inputs, targets)
+                return sum(loss_dict.values()), None
             outputs = model(inputs)
-            loss = criterion(outputs, labels)
-            loss.backward()
-            optimizer.step()
+            loss = self.criterion(outputs, targets)
+        return loss, (outputs.argmax(dim=1) == targets).sum()
+
+    def __backward(self, loss: torch.Tensor):
+        with self.profiler.phase("backward"):
+            self.optimizer.zero_grad(set_to_none=True)
+            if self.scaler is not None:
+                self.scaler.scale(loss).backward()
+            else:
+                loss.backward()
+
+        with self.profiler.phase("optimizer"):
+            if self.clip_grad_norm:
+                if self.scaler is not None:
+                    self.scaler.unscale_(self.optimizer)
+                nn.utils.clip_grad_norm_(self.model.parameters(), self.clip_grad_norm)
+            if self.scaler is not None:
+                self.scaler.step(self.optimizer)
+                self.scaler.update()
+            else:
+                self.optimizer.step()
+
+    def train_epoch(self, data_loader, epoch: int, batch_transforms=None, ema=None,
+                    start_batch: int = 0, step_callback=None) -> dict:
+        """Train the model for one epoch, updating the EMA model if given
+
+        When resuming, the data loader already skips the first `start_batch` batches and
+        `step_callback(epoch, batch_index)` is called after every optimizer step
+        """
+        self.model.train()
+        metrics = MetricTracker(self.device, ("loss",) if self.is_detection else
+                                ("loss", "accuracy"))
+        num_batches = len(data_loader)
+        start_time = time.perf_counter()
+        window_start = start_time
+        # Losses of the batches since the last print boundary, every batch goes to the log file
+        window_losses = []
+
+        batches = self.profiler.iterate(data_loader, "data")
+        for batch_index, batch in enumerate(batches, start_batch + 1):
+            with self.profiler.phase("h2d"):
+                inputs, targets, batch_size = self.__prepare_batch(batch, batch_transforms)
+
+            with self.profiler.phase("forward"):
+                loss, correct = self.__forward(self.model, inputs, targets)
+            self.__backward(loss)
+            if ema is not None:
+                with self.profiler.phase("ema"):
+                    ema.step()
+            self.global_step += 1
+
+            # Metrics stay on the device and are only synchronised at print boundaries
+            metrics.update("loss", loss * batch_size, batch_size)
+            if correct is not None:
+                metrics.update("accuracy", correct, batch_size)
+            if self.logger.writes_to_file:
+                window_losses.append(loss.detach())
+            if self.logger.is_print_batch(batch_index, num_batches):
+                with self.profiler.phase("logging"):
+                    means, window_samples = metrics.reduce()
+                    # One host copy for the whole window, the last batch is logged below
+                    losses = torch.stack(window_losses).tolist() if window_losses else []
+                    for index, batch_loss in enumerate(losses[:-1], batch_index - len(losses) + 1):
+                        self.logger.log_batch_loss(epoch, index, num_batches, batch_loss)
+                    window_losses.clear()
+                    window_end = time.perf_counter()
+                    self.logger.log_batch(epoch, batch_index, num_batches, self.global_step,
+                                          samples_per_sec=window_samples /
+                                          (window_end - window_start),
+                                          **means)
+                    window_start = window_end
+            if step_callback is not None:
+                with self.profiler.phase("checkpoint"):
+                    step_callback(epoch, batch_index)
+
+        metrics.reduce()
+        means, num_samples = metrics.get_totals()
+        duration = time.perf_counter() - start_time
+        result = {
+            **means,
+            "duration": duration,
+            "samples_per_sec": num_samples / duration if duration > 0 else 0.
+        }
+        self.logger.log_epoch_end(epoch, **result)
+        return result
+
+    def __set_eval_mode(self, model: nn.Module) -> dict:
+        """Put the model in evaluation mode and return the previous mode of every module"""
+        modes = {module: module.training for module in model.modules()}
+        if not self.is_detection:
+            model.eval()
+            return modes
+
+        # Torchvision detection models only return losses in training mode, norm and dropout
+        # layers still run in eval mode, so validation never changes the running statistics
+        model.train()
+        for module in model.modules():
+            if isinstance(module, _TRAIN_MODE_LAYERS):
+                module.eval()
+        return modes
 
-            logger.log_batch(batch_index, loss.item())
+    @staticmethod
+    def __restore_mode(modes: dict):
+        for module, training in modes.items():
+            module.training = training
 
-            epoch_loss += loss.item()
+    @torch.inference_mode()
+    def evaluate(self, data_loader, epoch: int, batch_transforms=None, model: nn.Module = None,
+                 name: str = "Model") -> dict:
+        """Evaluate the model, detection models are evaluated by their validation loss"""
+        model = model or self.model
+        modes = self.__set_eval_mode(model)
+        metrics = MetricTracker(self.device, ("loss",) if self.is_detection else
+                                ("loss", "accuracy"))
 
-        trainer.train_logger.log_epoch_end(epoch, epoch_loss)
+        try:
+            for batch in data_loader:
+                inputs, targets, batch_size = self.__prepare_batch(batch, batch_transforms)
+                loss, correct = self.__forward(model, inputs, targets)
+                metrics.update("loss", loss * batch_size, batch_size)
+                if correct is not None:
+                    metrics.update("accuracy", correct, batch_size)
+        finally:
+            self.__restore_mode(modes)
 
-        if trainer.train_logger.checkpoint_save_type is not None:
-            trainer.train_logger.save_checkpoint(epoch, model.state_dict(), optimizer.state_dict())
+        means, _ = metrics.reduce()
+        result = {"loss": means["loss"], "accuracy": means.get("accuracy")}
+        self.logger.log_eval(epoch, name=name, **result)
+        return result
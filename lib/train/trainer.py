@@ -1,31 +1,134 @@
 import os
 import torch
+from torch import nn
+from torch import distributed as dist
+from torch.nn.parallel import DistributedDataParallel
+from torchvision import models
 
 from lib.args.args_loader import ArgsLoader
 from lib.config_loaders.hyp_config import HypConfig
 from lib.logging.train_logger import TrainLogger
 from lib.data.data_loader import DataLoader
+from lib.data.autotune import LoaderTuner, load_tuning, save_tuning
+from lib.hyp.optimizer import create_optimizer
+from lib.hyp.scheduler import create_scheduler
+from lib.train.train_epoch import EpochRunner
+from lib.train.ema import ExponentialMovingAverage
+from lib.train.checkpoint import (CheckpointManager, open_checkpoint, load_optimizer_state,
+                                  get_rng_state, set_rng_state)
+from lib.train import distributed
 from lib.logging import log_messages
 from lib.helpers import enums
+from lib.helpers.profiler import Profiler
 
 
 class Trainer:
     """Loads data and model, performs training and eval"""
 
-    def __init__(self, args):
+    # Gradient bucket size for DistributedDataParallel all-reduce
+    __DDP_BUCKET_CAP_MB = 25
+
+    def __init__(self, args, rank: int = 0, world_size: int = 1):
         """Constructor for Trainer"""
 
-        self.__logger: TrainLogger = TrainLogger()
+        self.__rank: int = rank
+        self.__world_size: int = world_size
+        self.__logger: TrainLogger = TrainLogger(is_main_process=rank == 0)
         self.__logger.load_config(custom=args.custom_log_cfg)
         self.__args_loader: ArgsLoader = self.__create_args_loader(args)
         self.__create_cache()
         self.__hyp_config: HypConfig = self.__create_hyp_config()
 
         self.__device = torch.device("cuda" if self.__args_loader.cuda else "cpu")
+        if world_size > 1:
+            self.__device = distributed.init_process_group(rank, world_size,
+                                                           self.__hyp_config.dist_url,
+                                                           self.__args_loader.cuda)
+            self.__logger.log_info(f"Initialized process group with {world_size} processes")
         self.__data_loader: DataLoader = self.__create_data_loader()
 
         self.__logger.init_logging(self.__args_loader, self.__hyp_config, self.__data_loader.config)
 
+        self.__model: nn.Module = None
+        self.__model_without_ddp: nn.Module = None
+        self.__runner: EpochRunner = None
+        self.__ema: ExponentialMovingAverage = None
+        self.__scheduler = None
+        self.__checkpoints: CheckpointManager = None
+        if self.__logger.is_main_process:
+            self.__checkpoints = CheckpointManager(self.__logger.checkpoint_dir,
+                                                   self.__logger.config.ckpt_save_type,
+                                                   self.__logger.config.last_n_ckpts,
+                                                   on_written=self.__on_checkpoint_written)
+        self.__start_epoch: int = self.__args_loader.start_epoch
+        self.__start_batch: int = 0
+        self.__train_sampler = None
+
+    def fit(self):
+        """Load the data and model, then train and evaluate for all epochs"""
+        # Rank 0 builds annotation indexes and caches first, the other ranks reuse them
+        if self.__world_size > 1 and self.__rank != 0:
+            dist.barrier()
+        self.__init_dataset(self.__args_loader.data_train, is_train=True)
+        self.__init_dataset(self.__args_loader.data_val, is_train=False)
+        if self.__world_size > 1 and self.__rank == 0:
+            dist.barrier()
+
+        workers, prefetch_factor = self.__get_loader_settings()
+        train_loader = self.__data_loader.get_data_loader(
+            is_train=True,
+            batch_size=self.__args_loader.batch_size,
+            workers=workers,
+            num_replicas=self.__world_size,
+            rank=self.__rank,
+            prefetch_factor=prefetch_factor)
+        val_loader = self.__data_loader.get_data_loader(
+            is_train=False,
+            batch_size=self.__args_loader.batch_size,
+            workers=workers,
+            num_replicas=self.__world_size,
+            rank=self.__rank,
+            prefetch_factor=prefetch_factor)
+        self.__train_sampler = train_loader.batch_sampler
+        self.__log_padding_ratio(train_loader)
+
+        self.__create_model()
+        self.__create_runner()
+        self.__load_checkpoint()
+
+        if self.__args_loader.eval:
+            self.__evaluate(val_loader, self.__start_epoch)
+            distributed.cleanup()
+            return
+
+        self.__logger.log_train_start(self.__start_epoch, self.__args_loader.epochs)
+        for epoch in range(self.__start_epoch, self.__args_loader.epochs):
+            for sampler in (train_loader.sampler, train_loader.batch_sampler):
+                if hasattr(sampler, "set_epoch"):
+                    sampler.set_epoch(epoch)
+            profiler = self.__runner.profiler
+            profiler.reset()
+            self.__runner.train_epoch(train_loader, epoch,
+                                      batch_transforms=self.__data_loader.batch_transforms_train,
+                                      ema=self.__ema,
+                                      start_batch=self.__start_batch,
+                                      step_callback=self.__on_train_step)
+            self.__start_batch = 0
+            self.__scheduler.step()
+            with profiler.phase("evaluate"):
+                metrics = self.__evaluate(val_loader, epoch)
+            with profiler.phase("checkpoint"):
+                self.__save_checkpoint(epoch, metrics)
+            if profiler.enabled:
+                self.__logger.log_profile(epoch, profiler.get_table())
+
+        distributed.cleanup()
+
+    def close(self):
+        """Wait for pending checkpoint writes and flush the log file"""
+        self.__close_checkpoints()
+        self.__logger.close()
+
     def __create_args_loader(self, args):
         self.__logger.log_info("Loading and verifying args...")
         try:
@@ -42,11 +145,8 @@ class Trainer:
     def __create_cache(self):
         if not self.__args_loader.cache_dataset:
             return
-        cache_root = os.path.expanduser(os.path.join("~", dir_names.CacheDirNames.ROOT.value))
-        if not os.path.exists(cache_root):
-            os.mkdir(cache_root)
-        if self.__args_loader.cache_dataset:
-            os.mkdir(os.path.join(cache_root, dir_names.CacheDirNames.DATASETS.value))
+        cache_root = os.path.expanduser(os.path.join("~", enums.CacheDirNames.ROOT.value))
+        os.makedirs(os.path.join(cache_root, enums.CacheDirNames.DATASETS.value), exist_ok=True)
 
     def __create_hyp_config(self):
         self.__logger.log_info("Loading and verifying hyperparameter config...")
@@ -76,7 +176,8 @@ class Trainer:
             self.__logger.log_warning(
                 "Using values from default data config!")
         try:
-            data_loader = DataLoader(self.__args_loader.custom_data_config, self.__device)
+            data_loader = DataLoader(self.__args_loader.custom_data_config, self.__device,
+                                     self.__args_loader.method)
             self.__logger.log_success("Loaded and verified data config!")
             return data_loader
         except (ValueError, TypeError) as exc:
@@ -88,22 +189,242 @@ class Trainer:
 
     def __init_dataset(self, split_path: str, is_train: bool):
         data_path = os.path.join(self.__args_loader.data_path, split_path)
-        cache_path = self.__data_loader.get_cache_path(data_path)
-        if self.__args_loader.cache_dataset and os.path.exists(cache_path):
-            self.__logger.log_files(f"Loading cached dataset from {cache_path}...")
-            time = self.__data_loader.load_cached_dataset(cache_path=cache_path)
-            self.__logger.log_files(f"Loaded cached dataset in {time}s!")
+        if self.__args_loader.cache_dataset and self.__rank != 0:
+            # Rank 0 brought the shard up to date before the barrier, the other ranks only open it
+            cache_path = self.__data_loader.get_cache_path(data_path)
+            self.__logger.log_files(f"Loading dataset shard {cache_path}...")
+            _, time = self.__data_loader.load_cached_dataset(cache_path=cache_path,
+                                                             is_train=is_train)
+            self.__logger.log_success(f"Loaded dataset shard in {time:.2f}s!")
             return
 
         self.__logger.log_files(f"Loading dataset from {data_path}...")
-        time = self.__data_loader.load_dataset(
-            train_path=data_path,
+        _, time = self.__data_loader.load_dataset(
+            split_path=data_path,
             dataset_type=self.__args_loader.dataset_type,
-            is_train=is_train)
-        self.__logger.log_success(f"Loaded dataset in {time}s!")
-        if self.__args_loader.cache_dataset:
-            self.__logger.log_saving("Caching dataset...")
-            self.__data_loader.cache_dataset(
-                dir_path=data_path,
-                cache_path=cache_path)
-            self.__logger.log_success("Cached dataset!")
+            is_train=is_train,
+            method=self.__args_loader.method)
+        self.__logger.log_success(f"Loaded dataset in {time:.2f}s!")
+        if not self.__args_loader.cache_dataset:
+            return
+
+        # The shard is diffed against the directory, only changed files are packed again
+        cache_path = self.__data_loader.get_cache_path(data_path)
+        self.__logger.log_saving(f"Updating dataset shard {cache_path}...")
+        changes = self.__data_loader.cache_dataset(cache_path=cache_path,
+                                                   dataset_type=self.__args_loader.dataset_type,
+                                                   is_train=is_train)
+        self.__logger.log_success(f"Cached dataset, {changes['added']} added, "
+                                  f"{changes['changed']} changed and {changes['removed']} "
+                                  f"removed files!")
+
+    def __get_loader_settings(self) -> tuple:
+        if self.__args_loader.workers != "auto":
+            return self.__args_loader.workers, None
+
+        # Rank 0 probes with its share of the cores while the other ranks wait for the result
+        settings = None
+        if self.__rank == 0:
+            tuner = LoaderTuner(self.__data_loader, self.__args_loader.batch_size,
+                                cpu_budget=LoaderTuner.get_cpu_budget(self.__world_size))
+            train_path = os.path.join(self.__args_loader.data_path, self.__args_loader.data_train)
+            fingerprint = tuner.get_fingerprint(train_path)
+            settings = load_tuning(fingerprint)
+            if settings is None:
+                self.__logger.log_info("Probing dataloader workers and prefetch depth...")
+                settings = tuner.tune()
+                save_tuning(fingerprint, settings)
+            else:
+                self.__logger.log_files("Using cached dataloader settings")
+            self.__logger.log_success(f"Using {settings['workers']} workers with prefetch factor "
+                                      f"{settings['prefetch_factor']}, "
+                                      f"{settings['images_per_sec']:.1f} images/s")
+        if self.__world_size > 1:
+            settings_list = [settings]
+            dist.broadcast_object_list(settings_list, src=0)
+            settings = settings_list[0]
+        return settings["workers"], settings["prefetch_factor"]
+
+    def __log_padding_ratio(self, data_loader):
+        batch_sampler = getattr(data_loader.batch_sampler, "batch_sampler",
+                                data_loader.batch_sampler)
+        if not hasattr(batch_sampler, "padding_ratio"):
+            return
+        grouped, ungrouped = batch_sampler.padding_ratio()
+        self.__logger.log_info(f"Grouped batches by aspect ratio, padding {grouped * 100:.1f}% "
+                               f"instead of {ungrouped * 100:.1f}% of the batch area")
+
+    def __get_num_classes(self):
+        dataset = self.__data_loader.train_dataset
+        if hasattr(dataset, "num_classes"):
+            return dataset.num_classes
+        return len(dataset.classes)
+
+    def __create_model(self):
+        self.__logger.log_info(f"Loading model {self.__args_loader.model}...")
+        try:
+            if self.__args_loader.torch_hub_repo:
+                model = torch.hub.load(self.__args_loader.torch_hub_repo, self.__args_loader.model,
+                                       pretrained=self.__args_loader.torch_hub_pretrained)
+            elif self.__args_loader.weights_enum:
+                model = models.get_model(self.__args_loader.model,
+                                         weights=self.__args_loader.weights_enum)
+            else:
+                model = models.get_model(self.__args_loader.model,
+                                         num_classes=self.__get_num_classes())
+        except (ValueError, RuntimeError) as exc:
+            self.__logger.log_error(
+                process=log_messages.Processes.MODEL_LOADING,
+                exception_name=type(exc).__name__,
+                message=exc.args[0])
+            return
+
+        if self.__args_loader.sync_bn and self.__world_size > 1:
+            if self.__device.type == "cuda":
+                model = nn.SyncBatchNorm.convert_sync_batchnorm(model)
+            else:
+                self.__logger.log_warning("SyncBatchNorm is only supported on CUDA, ignoring "
+                                          "--sync-bn!")
+
+        model.to(self.__device)
+        if self.__args_loader.channels_last:
+            model.to(memory_format=torch.channels_last)
+        self.__model_without_ddp = model
+
+        if self.__world_size > 1:
+            device_ids = [self.__device.index] if self.__device.type == "cuda" else None
+            model = DistributedDataParallel(model, device_ids=device_ids,
+                                            bucket_cap_mb=self.__DDP_BUCKET_CAP_MB,
+                                            gradient_as_bucket_view=True)
+        self.__model = model
+        self.__logger.log_success("Loaded model!")
+
+        if self.__hyp_config.ema:
+            self.__ema = ExponentialMovingAverage(self.__model_without_ddp,
+                                                  decay=self.__hyp_config.ema_decay,
+                                                  steps=self.__hyp_config.ema_steps,
+                                                  cpu_offload=self.__hyp_config.ema_cpu_offload)
+
+    def __create_runner(self):
+        try:
+            optimizer = create_optimizer(self.__model_without_ddp, self.__hyp_config)
+            self.__scheduler = create_scheduler(optimizer, self.__hyp_config,
+                                                self.__args_loader.epochs)
+        except ValueError as exc:
+            self.__logger.log_error(
+                process=log_messages.Processes.OPTIMIZER_CREATION,
+                exception_name=type(exc).__name__,
+                message=exc.args[0])
+            return
+
+        criterion = nn.CrossEntropyLoss(label_smoothing=self.__hyp_config.label_smoothing or 0.0)
+        self.__runner = EpochRunner(model=self.__model,
+                                    criterion=criterion,
+                                    optimizer=optimizer,
+                                    device=self.__device,
+                                    logger=self.__logger,
+                                    is_detection=self.__args_loader.method == "detection",
+                                    amp=self.__args_loader.amp,
+                                    channels_last=self.__args_loader.channels_last,
+                                    clip_grad_norm=self.__hyp_config.clip_grad_norm)
+        synchronize = torch.cuda.synchronize if self.__device.type == "cuda" else None
+        self.__runner.profiler = Profiler(enabled=self.__logger.config.profile,
+                                          synchronize=synchronize)
+
+    def __evaluate(self, val_loader, epoch: int) -> dict:
+        batch_transforms = self.__data_loader.batch_transforms_eval
+        result = self.__runner.evaluate(val_loader, epoch, batch_transforms=batch_transforms)
+        if self.__ema is None:
+            return result
+        with self.__ema.on_device(self.__device) as ema_model:
+            self.__runner.evaluate(val_loader, epoch, batch_transforms=batch_transforms,
+                                   model=ema_model, name="EMA")
+        return result
+
+    def __on_train_step(self, epoch: int, batch_index: int):
+        save_every = self.__logger.config.save_every_n_steps
+        if not save_every or self.__runner.global_step % save_every:
+            return
+        if batch_index < len(self.__train_sampler):
+            self.__save_checkpoint(epoch, batch_index=batch_index)
+
+    def __save_checkpoint(self, epoch: int, metrics: dict = None, batch_index: int = None):
+        if self.__checkpoints is None:
+            return
+        checkpoint = {
+            "epoch": epoch,
+            "global_step": self.__runner.global_step,
+            "model": self.__model_without_ddp.state_dict(),
+            "optimizer": self.__runner.optimizer.state_dict(),
+            "scheduler": self.__scheduler.state_dict(),
+            "rng": get_rng_state()
+        }
+        if batch_index is not None:
+            checkpoint["sampler"] = self.__train_sampler.state_dict(batch_index)
+        if self.__runner.scaler is not None:
+            checkpoint["scaler"] = self.__runner.scaler.state_dict()
+        if self.__ema is not None:
+            checkpoint["model_ema"] = self.__ema.state_dict()
+        try:
+            step = None if batch_index is None else self.__runner.global_step
+            self.__checkpoints.save(checkpoint, epoch, metrics, step)
+        except OSError as exc:
+            self.__logger.log_error(
+                process=log_messages.Processes.CHECKPOINT_SAVING,
+                exception_name=type(exc).__name__,
+                message=str(exc))
+
+    def __on_checkpoint_written(self, path: str, exc: Exception):
+        # Runs on the writer thread, a failure stops training at the next save or when closing
+        if exc is None:
+            self.__logger.log_saving(f"Saved checkpoint to {path}")
+            return
+        self.__logger.log_error(
+            process=log_messages.Processes.CHECKPOINT_SAVING,
+            exception_name=type(exc).__name__,
+            message=f"Could not write checkpoint {path}: {exc}",
+            exit_process=False)
+
+    def __close_checkpoints(self):
+        if self.__checkpoints is None:
+            return
+        try:
+            self.__checkpoints.close()
+        except OSError as exc:
+            self.__logger.log_error(
+                process=log_messages.Processes.CHECKPOINT_SAVING,
+                exception_name=type(exc).__name__,
+                message=str(exc))
+
+    def __load_checkpoint(self):
+        if self.__args_loader.resume_from is None:
+            return
+        self.__logger.log_files(f"Resuming from checkpoint {self.__args_loader.resume_from}...")
+        # Tensors are copied straight from the memory mapped checkpoint into the built model
+        checkpoint = open_checkpoint(self.__args_loader.resume_from)
+        self.__model_without_ddp.load_state_dict(checkpoint["model"])
+        if self.__ema is not None and "model_ema" in checkpoint:
+            self.__ema.load_state_dict(checkpoint["model_ema"])
+        elif self.__ema is not None:
+            # The EMA was built from the initial weights, start it from the resumed ones instead
+            self.__ema.module.load_state_dict(self.__model_without_ddp.state_dict())
+        if not self.__args_loader.eval:
+            load_optimizer_state(self.__runner.optimizer, checkpoint["optimizer"])
+            self.__scheduler.load_state_dict(checkpoint["scheduler"])
+            if self.__runner.scaler is not None and "scaler" in checkpoint:
+                self.__runner.scaler.load_state_dict(checkpoint["scaler"])
+            if "global_step" in checkpoint:
+                self.__runner.global_step = checkpoint["global_step"]
+            if "rng" in checkpoint:
+                set_rng_state(checkpoint["rng"])
+
+        # Mid-epoch checkpoints continue the interrupted epoch at the next batch
+        if "sampler" in checkpoint and not self.__args_loader.eval:
+            self.__train_sampler.load_state_dict(checkpoint["sampler"])
+            self.__start_epoch = checkpoint["epoch"]
+            self.__start_batch = self.__train_sampler.start_batch
+            self.__logger.log_success(f"Resumed from epoch {checkpoint['epoch']} at batch "
+                                      f"{self.__start_batch}!")
+            return
+        self.__start_epoch = checkpoint["epoch"] + 1
+        self.__logger.log_success(f"Resumed from epoch {checkpoint['epoch']}!")
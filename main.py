@@ -1,9 +1,32 @@
+from torch import multiprocessing
+
 from lib.args.args_parser import get_args_parser
+from lib.train import distributed
 from lib.train.trainer import Trainer
 
 
-if __name__ == '__main__':
+def run(rank: int, args, world_size: int):
+    # Init the trainer
+    trainer = Trainer(args=args, rank=rank, world_size=world_size)
+
+    # Train and evaluate
+    try:
+        trainer.fit()
+    finally:
+        trainer.close()
+
+
+def main():
     args = get_args_parser().parse_args()
+    world_size = distributed.get_world_size(args)
 
-    # Init the trainer
-    trainer = Trainer(args=args)
+    if world_size > 1:
+        # One process per rank on this host, all sharing the same rendezvous address
+        distributed.prepare_env()
+        multiprocessing.spawn(run, args=(args, world_size), nprocs=world_size)
+    else:
+        run(0, args, 1)
+
+
+if __name__ == '__main__':
+    main()